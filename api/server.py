@@ -1,7 +1,9 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from modules.ocr.ocr_service import extract_text_from_upload
+from modules.ocr.result import result_pages, result_to_dict, pages_to_ipc
 from modules.forensics.forensic_pipeline import analyze_document_forensics
 from modules.genai.llm_engine import run_llm
 
@@ -15,10 +17,15 @@ app.add_middleware(
 )
 
 @app.post("/ocr")
-async def ocr_endpoint(file: UploadFile = File(...)):
+async def ocr_endpoint(file: UploadFile = File(...), format: str = "json"):
+    # same shapes as run.py: OCRPage lines are columnar, not JSON-serializable as is
+    if format not in ("json", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be json or arrow")
     content = await file.read()
-    text = extract_text_from_upload(content, file.filename)
-    return {"text": text}
+    ocr = extract_text_from_upload(content, file.filename)
+    if format == "arrow":
+        return Response(content=pages_to_ipc(result_pages(ocr)), media_type="application/vnd.apache.arrow.stream")
+    return result_to_dict(ocr)
 
 @app.post("/forensics")
 async def forensics_endpoint(file: UploadFile = File(...)):
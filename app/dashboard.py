@@ -21,6 +21,7 @@ st.set_page_config(page_title="AI Fraud & Document Forensics", layout="wide", in
 
 # Standard libs
 import io
+import importlib.util
 import time
 from datetime import datetime
 from PIL import Image
@@ -33,10 +34,13 @@ local_forensics = local_ocr = local_news = local_genai = True
 # OCR service fallback
 try:
     from modules.ocr.ocr_service import extract_text_from_upload
+    # engines load lazily now, so check the dependency up front
+    if importlib.util.find_spec("paddleocr") is None:
+        raise ImportError("paddleocr not installed")
 except Exception:
     local_ocr = False
 
-    def extract_text_from_upload(file_bytes, filename=None):
+    def extract_text_from_upload(file_bytes, filename=None, profile=None):
         try:
             import pytesseract
             from PIL import Image
@@ -53,23 +57,37 @@ except Exception:
 # Forensics fallback
 try:
     from modules.forensics.forensic_pipeline import analyze_document_forensics
+    from modules.forensics.artifacts import get_artifact
 except Exception:
     local_forensics = False
 
+    def get_artifact(art_id, fmt="png"):
+        return None
+
     def analyze_document_forensics(file_bytes):
         return {
             "fraud_score": 0.0,
             "tamper_score": 0.0,
             "tamper_details": "Forensics module not available locally.",
-            "tamper_heatmap": None,
-            "ela_image": None,
+            "tamper_artifact": None,
+            "ela_artifact": None,
         }
 
 # News fallback
 try:
     from modules.news.preprocess import clean_text, extract_claims
-    from modules.news.classifier import NewsClassifier
-    from modules.news.rag_search import Retriever
+    import modules.news.classifier  # registers "news_classifier"
+    import modules.news.rag_search  # registers "retriever"
+    from core.models import get_model
+    if importlib.util.find_spec("transformers") is None:
+        raise ImportError("transformers not installed")
+
+    # shared, lazily loaded instances instead of a new model per click
+    def get_news_classifier():
+        return get_model("news_classifier")
+
+    def get_retriever():
+        return get_model("retriever")
 except Exception:
     local_news = False
 
@@ -99,6 +117,12 @@ except Exception:
         def query(self, q, top_k=3):
             return []
 
+    def get_news_classifier():
+        return NewsClassifier()
+
+    def get_retriever():
+        return Retriever()
+
 # GenAI fallback
 try:
     from modules.genai.llm_engine import run_llm
@@ -190,6 +214,8 @@ def render_left(container):
             st.success(f"File ready: {filename}")
 
         fast_mode = st.checkbox("FAST MODE (lower DPI, faster OCR)", value=True)
+        # fast: text only, no angle classifier, lower resolution; full: + layout, handwriting, ID fields
+        ocr_profile = "fast" if fast_mode else "full"
 
         if st.button("Analyze Document", key="analyze_doc_btn"):
             if not file_bytes:
@@ -198,7 +224,9 @@ def render_left(container):
                 st.info("Running OCR...")
                 t0 = time.time()
                 try:
-                    ocr_text = extract_text_from_upload(file_bytes, filename)
+                    ocr_text = extract_text_from_upload(file_bytes, filename, profile=ocr_profile)
+                    if isinstance(ocr_text, dict):
+                        ocr_text = ocr_text.get("text", "")
                 except Exception as e:
                     ocr_text = f"[OCR failed: {e}]"
 
@@ -209,36 +237,33 @@ def render_left(container):
                 try:
                     forensic = analyze_document_forensics(file_bytes)
                 except Exception as e:
-                    forensic = {"fraud_score": 0.0, "tamper_score": 0.0, "tamper_details": f"Error: {e}", "tamper_heatmap": None, "ela_image": None}
+                    forensic = {"fraud_score": 0.0, "tamper_score": 0.0, "tamper_details": f"Error: {e}", "tamper_artifact": None, "ela_artifact": None}
 
                 st.subheader("Forensics")
                 st.write("Fraud score:", forensic.get("fraud_score"))
                 st.write("Tamper score:", forensic.get("tamper_score"))
                 st.write(forensic.get("tamper_details"))
-                if forensic.get("tamper_heatmap"):
-                    try:
-                        st.image(forensic["tamper_heatmap"], caption="Tamper heatmap")
-                    except Exception:
-                        pass
-                if forensic.get("ela_image"):
-                    try:
-                        st.image(forensic["ela_image"], caption="ELA")
-                    except Exception:
-                        pass
+                # artifacts are rendered on demand from their IDs
+                for key, caption in (("tamper_artifact", "Tamper heatmap"), ("noise_artifact", "Noise map"), ("ela_artifact", "ELA")):
+                    if forensic.get(key):
+                        try:
+                            st.image(get_artifact(forensic[key]), caption=caption)
+                        except Exception:
+                            pass
 
                 st.info("Running fake-news classifier (best-effort)...")
                 try:
                     cleaned = clean_text(ocr_text or "")
                     claims = extract_claims(cleaned)
                     st.write("Claims:", claims or "none")
-                    clf = NewsClassifier(model_path="distilbert-base-uncased")
+                    clf = get_news_classifier()
                     pred = clf.predict([cleaned])[0]
                     label_map = {0: "REAL / TRUSTWORTHY", 1: "FAKE / MISLEADING"}
                     st.write("Prediction:", label_map.get(pred.get("label_id", 0)))
                     st.write("Confidence:", pred.get("confidence", 0.0))
                     st.json(pred.get("probabilities", []))
                     try:
-                        retr = Retriever()
+                        retr = get_retriever()
                         evidence = retr.query(claims[0] if claims else cleaned[:200], top_k=3)
                         if evidence:
                             st.write("Evidence found:")
@@ -0,0 +1,127 @@
+# core/batching.py
+"""
+In-process micro-batching shared by the model wrappers.
+
+Concurrent callers put their items on one queue and wait on a Future per
+item. A single worker thread drains the queue: a batch is run when it
+holds max_batch items or when its first item has waited max_wait_ms.
+With group_key, a drained batch is split into groups of equal key (e.g.
+crops of similar width) and fn runs once per group. Each result is set
+on its caller's Future; a failing call, or one that returns the wrong
+number of results, fails every Future of its group instead of leaving
+callers waiting. stats() reports queue depth and batch sizes.
+"""
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, wait
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch=16, max_wait_ms=10, name="micro-batcher", group_key=None):
+        """fn(list of items) -> list of results, same order and length."""
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self.group_key = group_key
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # written by the worker thread only
+        self._batches = 0
+        self._items = 0
+        self._sizes = Counter()
+        self._last_size = 0
+        self._wait_total = 0.0
+        self._max_queue_depth = 0
+        self._errors = 0
+
+    def _ensure_worker(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, items):
+        """Queue items and return one Future per item."""
+        self._ensure_worker()
+        futures = []
+        now = time.monotonic()
+        for item in items:
+            fut = Future()
+            self._queue.put((item, fut, now))
+            futures.append(fut)
+        return futures
+
+    def run(self, items, timeout=None):
+        """Blocking: results for items, batched with every other caller's."""
+        if not items:
+            return []
+        futures = self.submit(items)
+        _, pending = wait(futures, timeout)
+        if pending:
+            # the worker skips cancelled items
+            for fut in pending:
+                fut.cancel()
+            raise TimeoutError(f"{self.name}: batch timed out")
+        return [fut.result() for fut in futures]
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize() + len(batch))
+            # skip items whose caller already gave up
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if self.group_key is None:
+                groups = [batch] if batch else []
+            else:
+                by_key = {}
+                for entry in batch:
+                    by_key.setdefault(self.group_key(entry[0]), []).append(entry)
+                groups = list(by_key.values())
+            for group in groups:
+                self._flush(group)
+
+    def _flush(self, group):
+        start = time.monotonic()
+        try:
+            results = self.fn([item for item, _, _ in group])
+            if len(results) != len(group):
+                raise RuntimeError(f"{self.name}: {len(results)} results for a batch of {len(group)}")
+        except Exception as e:
+            self._errors += 1
+            for _, fut, _ in group:
+                fut.set_exception(e)
+            return
+        for (_, fut, _), res in zip(group, results):
+            fut.set_result(res)
+        self._batches += 1
+        self._items += len(group)
+        self._sizes[len(group)] += 1
+        self._last_size = len(group)
+        self._wait_total += sum(start - queued for _, _, queued in group)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self._max_queue_depth,
+            "batches": self._batches,
+            "items": self._items,
+            "failed_batches": self._errors,
+            "mean_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "last_batch_size": self._last_size,
+            "max_batch_size": max(self._sizes) if self._sizes else 0,
+            "batch_size_histogram": dict(sorted(self._sizes.items())),
+            "mean_queue_wait_ms": round(1000 * self._wait_total / self._items, 2) if self._items else 0.0,
+        }
@@ -0,0 +1,186 @@
+# core/cache.py
+"""
+Content-addressed result cache shared by OCR, forensics, news and LLM stages.
+
+Keys are SHA-256 over (stage, version, input hash, params), so a model or
+algorithm bump only needs a new version string. Values are pickled and
+live in two tiers: an in-process LRU and a SQLite table in the history
+database. The SQLite tier evicts entries older than RESULT_CACHE_MAX_AGE_DAYS
+and then the least recently used ones past RESULT_CACHE_MAX_MB.
+"""
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from core.config import (
+    HISTORY_DB_PATH,
+    RESULT_CACHE_ENABLED,
+    RESULT_CACHE_MEMORY_ITEMS,
+    RESULT_CACHE_MAX_MB,
+    RESULT_CACHE_MAX_AGE_DAYS,
+)
+
+# run size/age eviction every N writes rather than on each one
+EVICT_EVERY = 32
+
+
+def sha256_hex(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(stage, version, input_hash, **params) -> str:
+    parts = [stage, str(version), input_hash] + [f"{k}={params[k]!r}" for k in sorted(params)]
+    return sha256_hex("\x1f".join(parts))
+
+
+class ResultCache:
+    def __init__(self, db_path=HISTORY_DB_PATH, memory_items=RESULT_CACHE_MEMORY_ITEMS,
+                 max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024, max_age_s=RESULT_CACHE_MAX_AGE_DAYS * 86400):
+        self.db_path = db_path
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db_ok = True
+        try:
+            with self._connect() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS result_cache (
+                        key TEXT PRIMARY KEY,
+                        stage TEXT,
+                        created REAL,
+                        accessed REAL,
+                        size INTEGER,
+                        value BLOB
+                    )""")
+                conn.execute("CREATE INDEX IF NOT EXISTS result_cache_accessed ON result_cache (accessed)")
+        except sqlite3.Error:
+            # read-only or missing data dir: keep the memory tier only
+            self._db_ok = False
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _remember(self, key, blob):
+        with self._lock:
+            self._memory[key] = blob
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Cached value or None."""
+        with self._lock:
+            blob = self._memory.get(key)
+            if blob is not None:
+                self._memory.move_to_end(key)
+        if blob is None and self._db_ok:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute(
+                        "SELECT value, created FROM result_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        now = time.time()
+                        if now - row[1] > self.max_age_s:
+                            conn.execute("DELETE FROM result_cache WHERE key = ?", (key,))
+                        else:
+                            blob = row[0]
+                            conn.execute("UPDATE result_cache SET accessed = ? WHERE key = ?", (now, key))
+            except sqlite3.Error:
+                blob = None
+            if blob is not None:
+                self._remember(key, blob)
+        # unpickle per hit so callers never share (and mutate) one cached object
+        return pickle.loads(blob) if blob is not None else None
+
+    def contains(self, key):
+        """True if key is in either tier (expiry is not checked)."""
+        with self._lock:
+            if key in self._memory:
+                return True
+        if not self._db_ok:
+            return False
+        try:
+            with self._connect() as conn:
+                return conn.execute("SELECT 1 FROM result_cache WHERE key = ?", (key,)).fetchone() is not None
+        except sqlite3.Error:
+            return False
+
+    def put(self, key, value, stage="", memory=True):
+        """Store value; memory=False writes the SQLite tier only (large blobs)."""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if memory:
+            self._remember(key, blob)
+        if not self._db_ok:
+            return
+        try:
+            now = time.time()
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO result_cache (key, stage, created, accessed, size, value) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, stage, now, now, len(blob), blob),
+                )
+                self._writes += 1
+                if self._writes % EVICT_EVERY == 0:
+                    self._evict(conn, now)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM result_cache WHERE created < ?", (now - self.max_age_s,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM result_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM result_cache ORDER BY accessed"):
+            stale.append((key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        conn.executemany("DELETE FROM result_cache WHERE key = ?", stale)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._db_ok:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM result_cache")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
+
+
+def cached_call(stage, version, input_hash, compute, should_cache=None, **params):
+    """
+    Return the cached result for (stage, version, input_hash, params) or run
+    compute() and store it. should_cache(result) can veto storing results
+    such as error strings. Exceptions from compute() are never cached.
+    """
+    if not RESULT_CACHE_ENABLED:
+        return compute()
+    cache = get_cache()
+    key = cache_key(stage, version, input_hash, **params)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+    result = compute()
+    if result is not None and (should_cache is None or should_cache(result)):
+        cache.put(key, result, stage)
+    return result
@@ -7,3 +7,80 @@ SAMPLES_DIR = os.path.join(DATA_DIR, "samples")
 
 # HARD SET TESSERACT PATH HERE
 TESSERACT_CMD = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+
+# Working-memory budget per tile for tiled forensics on very large scans
+FORENSICS_TILE_BUDGET_MB = int(os.getenv("FORENSICS_TILE_BUDGET_MB", "64"))
+
+# Triage mode: cheap-stage risk outside [LOW, HIGH) skips the expensive stages
+FORENSICS_TRIAGE_BAND = (
+    int(os.getenv("FORENSICS_TRIAGE_LOW", "25")),
+    int(os.getenv("FORENSICS_TRIAGE_HIGH", "70")),
+)
+FORENSICS_TRIAGE_ELA_MAX_SIDE = 1024
+
+# Pages of a multi-page TIFF analyzed concurrently
+FORENSICS_PAGE_WORKERS = int(os.getenv("FORENSICS_PAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Start method for the batch forensics process pool. Forking a server that
+# already runs model and batcher threads can deadlock the children, so the
+# default is "forkserver" where available, else "spawn".
+FORENSICS_BATCH_START_METHOD = os.getenv("FORENSICS_BATCH_START_METHOD", "")
+
+# PDF forensics: embedded images smaller than this (icons, logos) are skipped,
+# and at most this many images per PDF are analyzed
+PDF_FORENSICS_MIN_IMAGE_SIDE = int(os.getenv("PDF_FORENSICS_MIN_IMAGE_SIDE", "64"))
+PDF_FORENSICS_MAX_IMAGES = int(os.getenv("PDF_FORENSICS_MAX_IMAGES", "64"))
+
+# Byte budget for lazily rendered forensic artifacts (heatmaps, ELA images)
+ARTIFACT_CACHE_MB = int(os.getenv("ARTIFACT_CACHE_MB", "256"))
+
+# Shared SQLite file for analysis history and the near-duplicate page index
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join(DATA_DIR, "analysis_history.db"))
+
+# Near-duplicate lookup: max Hamming distance (of 64 bits) for pHash and dHash
+DEDUP_PHASH_MAX_DISTANCE = int(os.getenv("DEDUP_PHASH_MAX_DISTANCE", "10"))
+DEDUP_DHASH_MAX_DISTANCE = int(os.getenv("DEDUP_DHASH_MAX_DISTANCE", "8"))
+# Near-duplicates are informational (pages from one template match each other);
+# only a match whose earlier analysis scored at least this adds a penalty
+DEDUP_FLAGGED_SCORE = float(os.getenv("DEDUP_FLAGGED_SCORE", "70"))
+
+# Content-addressed result cache (memory LRU + SQLite tier in HISTORY_DB_PATH)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") != "0"
+RESULT_CACHE_MEMORY_ITEMS = int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", "256"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "512"))
+RESULT_CACHE_MAX_AGE_DAYS = int(os.getenv("RESULT_CACHE_MAX_AGE_DAYS", "30"))
+
+# Streaming PDF OCR: render DPI and page workers (in-flight pages = 2 x workers)
+OCR_PDF_DPI = int(os.getenv("OCR_PDF_DPI", "180"))
+OCR_PDF_WORKERS = int(os.getenv("OCR_PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# OCR profile when callers do not pass one: fast | standard | full | auto
+OCR_DEFAULT_PROFILE = os.getenv("OCR_DEFAULT_PROFILE", "full")
+
+# Layout labels whose regions are sent to the handwriting recognizer. The stock
+# PP-StructureV3 layout models do not emit these classes, so with them no region
+# matches and the whole page is read instead (HANDWRITING_FULL_PAGE_FALLBACK);
+# set the labels of a handwriting-aware layout model to crop regions only.
+HANDWRITING_LAYOUT_LABELS = frozenset(
+    s.strip().lower() for s in os.getenv("HANDWRITING_LAYOUT_LABELS", "handwriting,handwritten,signature").split(",")
+)
+HANDWRITING_FULL_PAGE_FALLBACK = os.getenv("HANDWRITING_FULL_PAGE_FALLBACK", "1") != "0"
+
+# Models to load in the background at API startup (comma list, e.g. "ocr,layout")
+PRELOAD_MODELS = [m.strip() for m in os.getenv("PRELOAD_MODELS", "").split(",") if m.strip()]
+
+# Cross-document batching of text-line recognition (modules/ocr/batching.py)
+OCR_BATCHING = os.getenv("OCR_BATCHING", "1") != "0"
+OCR_REC_BATCH_SIZE = int(os.getenv("OCR_REC_BATCH_SIZE", "32"))
+OCR_BATCH_MAX_WAIT_MS = int(os.getenv("OCR_BATCH_MAX_WAIT_MS", "15"))
+
+# Micro-batching of concurrent news classifier requests (modules/news/batching.py)
+NEWS_BATCHING = os.getenv("NEWS_BATCHING", "1") != "0"
+NEWS_BATCH_SIZE = int(os.getenv("NEWS_BATCH_SIZE", "16"))
+NEWS_BATCH_MAX_WAIT_MS = int(os.getenv("NEWS_BATCH_MAX_WAIT_MS", "10"))
+
+# OCR preprocessing: denoise strategy (auto | none | median | gaussian | bilateral) and deskew.
+# "auto" matched or beat the old bilateral path in bench_scripts/bench_preprocess.py
+# --ocr at about half the time; deskew added no accuracy there and stays opt-in.
+OCR_DENOISE = os.getenv("OCR_DENOISE", "auto")
+OCR_DESKEW = os.getenv("OCR_DESKEW", "0") != "0"
@@ -0,0 +1,85 @@
+# core/models.py
+"""
+Central registry of heavy models (OCR engines, spaCy, classifiers, ...).
+
+Modules register a zero-argument factory at import time, which is cheap;
+the model itself is built on the first get_model() call, once, even when
+several threads ask at the same time. warmup() preloads a selection and
+status() reports what is loaded and how long each load took.
+"""
+import threading
+import time
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._factories = {}
+        self._models = {}
+        self._locks = {}
+        self._timings = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self._factories:
+            raise KeyError(f"Unknown model {name!r}; registered: {sorted(self._factories)}")
+        # per-model lock: loading OCR does not block a concurrent spaCy load
+        with self._locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                t0 = time.perf_counter()
+                try:
+                    model = self._factories[name]()
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+                self._timings[name] = round(time.perf_counter() - t0, 3)
+                self._errors.pop(name, None)
+                self._models[name] = model
+        return model
+
+    def peek(self, name):
+        """The model if it is already loaded, else None (never loads it)."""
+        return self._models.get(name)
+
+    def warmup(self, names=None):
+        """Load the named models (default: all registered) and return status()."""
+        names = list(names) if names else sorted(self._factories)
+        unknown = [n for n in names if n not in self._factories]
+        if unknown:
+            raise KeyError(f"Unknown model(s) {unknown}; registered: {sorted(self._factories)}")
+        for name in names:
+            try:
+                self.get(name)
+            except Exception:
+                pass  # recorded in status()["error"]
+        return self.status()
+
+    def status(self):
+        return {
+            name: {
+                "loaded": name in self._models,
+                "load_seconds": self._timings.get(name),
+                "error": self._errors.get(name),
+            }
+            for name in sorted(self._factories)
+        }
+
+
+registry = ModelRegistry()
+
+
+def register_model(name, factory):
+    registry.register(name, factory)
+
+
+def get_model(name):
+    return registry.get(name)
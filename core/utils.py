@@ -1,10 +1,151 @@
 # core/utils.py
 import io
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import cached_property
 from PIL import Image
+import numpy as np
+import cv2
 import base64
-from typing import List
+from typing import List, Optional, Union
 
-def bytes_to_pil(data: bytes) -> Image.Image:
+
+class DocumentImage:
+    """
+    An uploaded image decoded once, with lazily computed shared views.
+    Forensics and OCR functions accept this in place of raw bytes so one
+    upload is not decoded and converted again by every stage.
+    """
+
+    def __init__(self, data: Optional[bytes] = None, pil: Optional[Image.Image] = None):
+        if data is None and pil is None:
+            raise ValueError("DocumentImage needs bytes or a PIL image")
+        self.data = data
+        if pil is not None:
+            self.__dict__["pil"] = pil
+
+    @classmethod
+    def from_pil(cls, pil_img: Image.Image) -> "DocumentImage":
+        return cls(pil=pil_img)
+
+    @cached_property
+    def pil(self) -> Image.Image:
+        """Raw decoded image in its original mode (EXIF intact)."""
+        img = Image.open(io.BytesIO(self.data))
+        img.load()
+        return img
+
+    @cached_property
+    def pil_rgb(self) -> Image.Image:
+        img = self.pil
+        return img if img.mode == "RGB" else img.convert("RGB")
+
+    @cached_property
+    def rgb(self) -> np.ndarray:
+        return np.asarray(self.pil_rgb)
+
+    @cached_property
+    def gray(self) -> np.ndarray:
+        return cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY)
+
+    @cached_property
+    def bgr(self) -> np.ndarray:
+        return cv2.cvtColor(self.rgb, cv2.COLOR_RGB2BGR)
+
+    @cached_property
+    def exif(self):
+        return self.pil.getexif()
+
+    @property
+    def size(self):
+        return self.pil.size
+
+    @cached_property
+    def content_hash(self) -> str:
+        """SHA-256 of the original bytes (of the pixels for PIL-built images)."""
+        if self.data is not None:
+            return hashlib.sha256(self.data).hexdigest()
+        img = self.pil
+        return hashlib.sha256(f"{img.mode}:{img.size}:".encode() + img.tobytes()).hexdigest()
+
+
+def to_document_image(data: Union[bytes, DocumentImage, Image.Image]) -> DocumentImage:
+    """Wrap bytes or a PIL image; pass an existing DocumentImage through."""
+    if isinstance(data, DocumentImage):
+        return data
+    if isinstance(data, Image.Image):
+        return DocumentImage.from_pil(data)
+    return DocumentImage(data)
+
+
+def _tiff_pages(img) -> int:
+    # only TIFF frames are document pages; MPO / GIF / APNG frames are
+    # previews, depth maps or animation and must not be scored as pages
+    return getattr(img, "n_frames", 1) if img.format == "TIFF" else 1
+
+
+def frame_count(data: Union[bytes, DocumentImage]) -> int:
+    """
+    Number of pages in a multi-page TIFF scan bundle; 1 for every other
+    image, multi-frame or not. Reads headers only, no pixel data.
+    """
+    if isinstance(data, DocumentImage):
+        if data.data is None:
+            return 1
+        data = data.data
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return _tiff_pages(img)
+    except Exception:
+        return 1
+
+
+def iter_frames(data: Union[bytes, DocumentImage], frames=None):
+    """
+    Lazily yield (page_no, DocumentImage) for the pages of a multi-page
+    TIFF, 1-based; frames restricts to those page numbers. The file is
+    opened once and each frame is decoded only when it is reached, so a
+    long fax bundle is never held whole. Any other image yields itself
+    as page 1 with its original bytes.
+    """
+    doc = to_document_image(data)
+    if doc.data is None or frame_count(doc) == 1:
+        yield 1, doc
+        return
+    img = Image.open(io.BytesIO(doc.data))
+    for page_no in frames or range(1, _tiff_pages(img) + 1):
+        img.seek(page_no - 1)
+        frame = DocumentImage.from_pil(img.copy())
+        # the copy drops the frame's TIFF tags; keep them for metadata checks
+        frame.__dict__["exif"] = img.getexif()
+        yield page_no, frame
+
+
+def iter_bounded(fn, items, workers, max_in_flight=None):
+    """
+    fn(*item) for every item on a thread pool, yielding results in
+    completion order. At most max_in_flight (default 2 x workers) items
+    are submitted at once, so a long stream of pages stays bounded.
+    """
+    max_in_flight = max_in_flight or 2 * workers
+    items = iter(items)
+    pending = set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            for item in items:
+                pending.add(pool.submit(fn, *item))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+
+
+def bytes_to_pil(data: Union[bytes, DocumentImage]) -> Image.Image:
+    if isinstance(data, DocumentImage):
+        return data.pil_rgb
     return Image.open(io.BytesIO(data)).convert("RGB")
 
 def pil_to_bytes(pil_img, fmt="JPEG") -> bytes:
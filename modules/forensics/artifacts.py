@@ -0,0 +1,193 @@
+# modules/forensics/artifacts.py
+"""
+Lazy, content-addressed forensic artifacts (heatmaps, ELA renders).
+
+The pipeline registers a render callback per artifact instead of building
+PIL images. IDs derive from the upload's content hash, the artifact kind
+and its parameters, so a re-upload maps to the same ID. An artifact is
+only rendered and encoded (PNG / WebP) when someone fetches it, and the
+store evicts least-recently-used entries past a byte budget.
+
+The store is per process, so registrations that pass a source are also
+recorded in the SQLite tier of core.cache: a recipe (kind, content hash,
+render params) plus the source once per content hash. A fetch that
+misses the local store, e.g. on another uvicorn worker or for a batch
+result scored in the process pool, rebuilds the render from the recipe
+with the renderer registered for its kind. Encoded outputs are written
+back so other workers serve them without rendering again. With
+RESULT_CACHE_ENABLED=0 artifacts stay process-local.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+from core.config import ARTIFACT_CACHE_MB, RESULT_CACHE_ENABLED
+from core.cache import get_cache, cache_key
+
+ARTIFACT_FORMATS = {"png": "PNG", "webp": "WEBP"}
+# bump when a renderer changes so persisted encodings are not served
+ARTIFACT_VERSION = "1"
+
+# kind -> fn(source, **render_params) returning a PIL image (or None)
+_renderers = {}
+
+
+def artifact_id(content_hash, kind, **params):
+    key = f"{content_hash}:{kind}:" + ",".join(f"{k}={params[k]}" for k in sorted(params))
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+class ArtifactStore:
+    """Thread-safe LRU of render callbacks and their encoded outputs, bounded in bytes."""
+
+    def __init__(self, max_bytes, on_encode=None):
+        self.max_bytes = max_bytes
+        self.on_encode = on_encode
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(entry):
+        return entry["retained"] + sum(len(b) for b in entry["encoded"].values())
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= self._size(old)
+
+    def register(self, art_id, render, retained_bytes=0):
+        """Store a zero-arg callback returning a PIL image; nothing is rendered now."""
+        if self.max_bytes <= 0:
+            # store disabled (batch workers): only the persisted recipe serves it
+            return art_id
+        with self._lock:
+            if art_id in self._entries:
+                self._entries.move_to_end(art_id)
+                return art_id
+            entry = {"render": render, "retained": retained_bytes, "encoded": {}}
+            self._entries[art_id] = entry
+            self._bytes += self._size(entry)
+            self._evict()
+        return art_id
+
+    def get(self, art_id, fmt="png"):
+        """Encoded artifact bytes, rendering on first request; None if unknown or evicted."""
+        if fmt not in ARTIFACT_FORMATS:
+            raise ValueError(f"Unsupported artifact format: {fmt}")
+        with self._lock:
+            entry = self._entries.get(art_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(art_id)
+            if fmt in entry["encoded"]:
+                return entry["encoded"][fmt]
+            render = entry["render"]
+
+        # render outside the lock; concurrent first fetches may both render
+        img = render()
+        if img is None:
+            return None
+        buf = io.BytesIO()
+        img.save(buf, format=ARTIFACT_FORMATS[fmt])
+        data = buf.getvalue()
+
+        with self._lock:
+            entry = self._entries.get(art_id)
+            fresh = entry is not None and fmt not in entry["encoded"]
+            if fresh:
+                entry["encoded"][fmt] = data
+                self._bytes += len(data)
+                self._evict()
+        if fresh and self.on_encode is not None:
+            self.on_encode(art_id, fmt, data)
+        return data
+
+    def __contains__(self, art_id):
+        with self._lock:
+            return art_id in self._entries
+
+
+def register_renderer(kind, fn):
+    """fn(source, **render_params) -> PIL image; rebuilds kind's renders in any process."""
+    _renderers[kind] = fn
+
+
+def _source_key(content_hash):
+    return cache_key("artifact-source", ARTIFACT_VERSION, content_hash)
+
+
+def _recipe_key(art_id):
+    return cache_key("artifact", ARTIFACT_VERSION, art_id)
+
+
+def _encoded_key(art_id, fmt):
+    return cache_key("artifact", ARTIFACT_VERSION, art_id, fmt=fmt)
+
+
+def _write_encoded(art_id, fmt, data):
+    if RESULT_CACHE_ENABLED:
+        try:
+            get_cache().put(_encoded_key(art_id, fmt), data, "artifact", memory=False)
+        except Exception:
+            pass
+
+
+store = ArtifactStore(ARTIFACT_CACHE_MB * 1024 * 1024, on_encode=_write_encoded)
+
+
+def _persist(art_id, content_hash, kind, source, render_params):
+    # a recipe row is tiny; the source is written once per upload, and
+    # neither is kept in the cache's memory tier
+    cache = get_cache()
+    if cache.contains(_recipe_key(art_id)):
+        return
+    if not cache.contains(_source_key(content_hash)):
+        cache.put(_source_key(content_hash), source, "artifact", memory=False)
+    cache.put(_recipe_key(art_id), {"kind": kind, "content_hash": content_hash, "params": render_params},
+              "artifact", memory=False)
+
+
+def register_artifact(content_hash, kind, render, retained_bytes=0, source=None, render_params=None, **params):
+    """
+    Register a lazy render and return its ID. With source (compressed
+    upload or page image) and a renderer for kind, the artifact can be
+    rebuilt by any process sharing the SQLite cache.
+    """
+    art_id = store.register(artifact_id(content_hash, kind, **params), render, retained_bytes)
+    if RESULT_CACHE_ENABLED and source is not None and kind in _renderers:
+        try:
+            _persist(art_id, content_hash, kind, source, render_params or {})
+        except Exception:
+            pass
+    return art_id
+
+
+def _restore(art_id):
+    # local miss: re-register the render from the persisted recipe
+    cache = get_cache()
+    recipe = cache.get(_recipe_key(art_id))
+    if recipe is None or recipe["kind"] not in _renderers:
+        return False
+    source = cache.get(_source_key(recipe["content_hash"]))
+    if source is None:
+        return False
+    fn, params = _renderers[recipe["kind"]], recipe["params"]
+    if isinstance(source, (bytes, bytearray)):
+        retained = len(source)
+    else:
+        retained = source.width * source.height * len(source.getbands())
+    store.register(art_id, lambda: fn(source, **params), retained)
+    return True
+
+
+def get_artifact(art_id, fmt="png"):
+    """Encoded artifact bytes, or None if unknown or expired in every tier."""
+    data = store.get(art_id, fmt)
+    if data is not None or not RESULT_CACHE_ENABLED:
+        return data
+    data = get_cache().get(_encoded_key(art_id, fmt))
+    if data is None and _restore(art_id):
+        data = store.get(art_id, fmt)
+    return data
@@ -0,0 +1,128 @@
+# modules/forensics/batch.py
+"""
+Parallel batch forensics over a process pool.
+
+analyze_batch() / analyze_batch_async() take an iterable of
+(filename, bytes) pairs and yield one result per document as soon as it
+finishes (completion order, not input order). Submission is bounded so
+a large backfill never holds more than `max_in_flight` payloads at once.
+
+Workers keep no artifact store of their own: a result's *_artifact IDs
+are recorded in the SQLite cache tier, so the API process can render
+them on fetch (see artifacts.py). With RESULT_CACHE_ENABLED=0 batch
+results carry scores only.
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from modules.forensics import artifacts
+from modules.forensics.forensic_pipeline import analyze_document_forensics
+from core.config import FORENSICS_BATCH_START_METHOD, RESULT_CACHE_ENABLED
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp", ".pdf")
+
+# one pool per size; a pool is never shut down while the process runs,
+# since another batch may still be submitting to it
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _mp_context():
+    method = FORENSICS_BATCH_START_METHOD
+    if not method:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def get_pool(workers=None):
+    """Shared process pool of `workers` processes (default: available cores)."""
+    workers = workers or os.cpu_count() or 1
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context(),
+                                                         initializer=_init_worker)
+        return pool
+
+
+def _init_worker():
+    # nothing fetches from a worker, so retain no render callbacks here;
+    # registrations still write their recipes to the SQLite tier
+    artifacts.store.max_bytes = 0
+
+
+def _analyze_one(filename, data, kwargs):
+    # runs in the worker process; artifacts are registered only if the
+    # API process can rebuild them from the shared cache
+    kwargs = {"render": RESULT_CACHE_ENABLED, **kwargs}
+    try:
+        return {"filename": filename, "forensic": analyze_document_forensics(data, **kwargs)}
+    except Exception as e:
+        return {"filename": filename, "error": str(e)}
+
+
+def iter_zip_images(zip_bytes):
+    """
+    Lazily yield (name, bytes) for every image inside a zip archive.
+    The archive is opened eagerly so a corrupt zip raises here.
+    """
+    zf = zipfile.ZipFile(io.BytesIO(zip_bytes))
+
+    def members():
+        with zf:
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                yield info.filename, zf.read(info)
+
+    return members()
+
+
+def analyze_batch(items, workers=None, max_in_flight=None, **kwargs):
+    """
+    Run analyze_document_forensics over (filename, bytes) items in parallel.
+    Yields {"filename", "forensic"} or {"filename", "error"} per document
+    as each one completes. Extra kwargs go to analyze_document_forensics.
+    """
+    workers = workers or os.cpu_count() or 1
+    pool = get_pool(workers)
+    max_in_flight = max_in_flight or 2 * workers
+    items = iter(items)
+    pending = set()
+
+    while True:
+        for filename, data in items:
+            pending.add(pool.submit(_analyze_one, filename, data, kwargs))
+            if len(pending) >= max_in_flight:
+                break
+        if not pending:
+            return
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            yield fut.result()
+
+
+async def analyze_batch_async(items, workers=None, max_in_flight=None, **kwargs):
+    """Async variant of analyze_batch for the API; never blocks the event loop."""
+    workers = workers or os.cpu_count() or 1
+    pool = get_pool(workers)
+    max_in_flight = max_in_flight or 2 * workers
+    loop = asyncio.get_running_loop()
+    items = iter(items)
+    pending = set()
+
+    while True:
+        for filename, data in items:
+            pending.add(loop.run_in_executor(pool, _analyze_one, filename, data, kwargs))
+            if len(pending) >= max_in_flight:
+                break
+        if not pending:
+            return
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for fut in done:
+            yield fut.result()
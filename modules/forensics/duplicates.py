@@ -0,0 +1,218 @@
+# modules/forensics/duplicates.py
+"""
+Near-duplicate page index over perceptual hashes.
+
+Every analysed page is stored with a 64-bit pHash (DCT) and dHash
+(gradient) in the history SQLite file. Lookups walk an in-memory BK-tree
+keyed on pHash, so a query only visits the branches that can lie within
+the Hamming radius. dHash then confirms each candidate. The tree is
+loaded lazily and refreshed incrementally (rows with a higher id), so
+several processes can share one database. A (content_hash, page) pair is
+stored once, so byte-identical resubmissions never crowd the results.
+"""
+import sqlite3
+import threading
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from core.config import HISTORY_DB_PATH, DEDUP_PHASH_MAX_DISTANCE, DEDUP_DHASH_MAX_DISTANCE, DEDUP_FLAGGED_SCORE
+
+_popcount = getattr(int, "bit_count", None) or (lambda x: bin(x).count("1"))
+
+
+def hamming(a, b):
+    return _popcount(a ^ b)
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def phash(gray):
+    """64-bit DCT hash: low 8x8 frequencies of a 32x32 thumbnail vs their median."""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+def dhash(gray):
+    """64-bit gradient hash: horizontal neighbour comparisons on a 9x8 thumbnail."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+# SQLite integers are signed 64-bit
+def _to_db(h):
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+
+def _from_db(v):
+    return v + (1 << 64) if v < 0 else v
+
+
+class BKTree:
+    """BK-tree over 64-bit hashes; node = [hash, [(row_id, aux), ...], {distance: child}]."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, h, row_id, aux=None):
+        self.size += 1
+        if self.root is None:
+            self.root = [h, [(row_id, aux)], {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append((row_id, aux))
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [(row_id, aux)], {}]
+                return
+            node = child
+
+    def search(self, h, radius):
+        """Yield (distance, row_id, aux) for every entry within radius."""
+        if self.root is None:
+            return
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                for row_id, aux in node[1]:
+                    yield d, row_id, aux
+            # triangle inequality: only children keyed in [d - r, d + r] can match
+            for k, child in node[2].items():
+                if d - radius <= k <= d + radius:
+                    stack.append(child)
+
+
+class DuplicateIndex:
+    """Persistent pHash/dHash index of analysed pages backed by SQLite."""
+
+    def __init__(self, db_path=HISTORY_DB_PATH):
+        self.db_path = db_path
+        self.tree = BKTree()
+        self._last_id = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS page_hashes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT,
+                    content_hash TEXT,
+                    page INTEGER,
+                    phash INTEGER,
+                    dhash INTEGER,
+                    fraud_score REAL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS page_hashes_content ON page_hashes (content_hash)")
+            # databases written before the unique key may hold repeated rows; keep the first
+            conn.execute("""
+                DELETE FROM page_hashes WHERE id NOT IN (
+                    SELECT MIN(id) FROM page_hashes GROUP BY content_hash, page
+                )""")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS page_hashes_page ON page_hashes (content_hash, page)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _sync(self, conn):
+        # pull rows written since the last sync (by us or by other processes)
+        rows = conn.execute(
+            "SELECT id, phash, dhash, content_hash FROM page_hashes WHERE id > ? ORDER BY id", (self._last_id,)
+        )
+        for row_id, p, d, content_hash in rows:
+            self.tree.add(_from_db(p), row_id, (_from_db(d), content_hash))
+            self._last_id = row_id
+
+    def query(self, p, d, max_phash=DEDUP_PHASH_MAX_DISTANCE, max_dhash=DEDUP_DHASH_MAX_DISTANCE, limit=10,
+              exclude_hash=None):
+        """Stored pages within both radii, closest first, skipping uploads with exclude_hash."""
+        with self._lock, self._connect() as conn:
+            self._sync(conn)
+            hits = sorted(
+                (dp, hamming(d, aux[0]), row_id)
+                for dp, row_id, aux in self.tree.search(p, max_phash)
+                if aux[1] != exclude_hash and hamming(d, aux[0]) <= max_dhash
+            )[:limit]
+            matches = []
+            for dp, dd, row_id in hits:
+                row = conn.execute(
+                    "SELECT timestamp, content_hash, page, fraud_score FROM page_hashes WHERE id = ?", (row_id,)
+                ).fetchone()
+                if row is None:  # removed by another process's migration
+                    continue
+                ts, content_hash, page, score = row
+                matches.append({
+                    "id": row_id,
+                    "timestamp": ts,
+                    "content_hash": content_hash,
+                    "page": page,
+                    "phash_distance": dp,
+                    "dhash_distance": dd,
+                    "fraud_score": score,
+                })
+        return matches
+
+    def seen(self, content_hash):
+        """True if an upload with these exact bytes was indexed before."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM page_hashes WHERE content_hash = ? LIMIT 1", (content_hash,)
+            ).fetchone() is not None
+
+    def add(self, content_hash, p, d, page=0, fraud_score=None):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO page_hashes (timestamp, content_hash, page, phash, dhash, fraud_score) VALUES (?, ?, ?, ?, ?, ?)",
+                (datetime.now().isoformat(timespec="seconds"), content_hash, page, _to_db(p), _to_db(d), fraud_score),
+            )
+            self._sync(conn)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DuplicateIndex()
+        return _index
+
+
+def find_duplicates(gray, content_hash, flagged_score=DEDUP_FLAGGED_SCORE):
+    """
+    Hash a page and look it up. "near_duplicate" means a visually matching
+    page with different bytes; matches never include the upload's own
+    bytes, and byte-identical resubmissions are only reported as
+    "resubmitted". Near-duplicates are informational, since documents from
+    one template (monthly payslips, statements) match each other; only a
+    match whose earlier fraud_score reached flagged_score ("flagged_match")
+    adds a penalty.
+    """
+    p, d = phash(gray), dhash(gray)
+    index = get_index()
+    matches = index.query(p, d, exclude_hash=content_hash)
+    flagged = any(m["fraud_score"] is not None and m["fraud_score"] >= flagged_score for m in matches)
+    return {
+        "phash": f"{p:016x}",
+        "dhash": f"{d:016x}",
+        "matches": matches,
+        "resubmitted": index.seen(content_hash),
+        "near_duplicate": bool(matches),
+        "flagged_match": flagged,
+        "score_penalty": 15 if flagged else 0,
+    }
+
+
+def record_page(content_hash, phash_hex, dhash_hex, page=0, fraud_score=None):
+    get_index().add(content_hash, int(phash_hex, 16), int(dhash_hex, 16), page, fraud_score)
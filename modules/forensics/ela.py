@@ -1,30 +1,90 @@
 # modules/forensics/ela.py
-from PIL import Image, ImageChops, ImageEnhance
-import io
+from PIL import Image
+import numpy as np
+import cv2
+from core.utils import to_document_image
 
-def perform_ela(image_bytes: bytes, quality=85):
-    """Perform Error Level Analysis and return ELA image + score."""
+# two levels cost about the same as the old single PIL pass at quality 85
+ELA_QUALITIES = (75, 90)
+
+
+def _percentile_u8(values, q):
+    """Percentile of a uint8 array from its 256-bin histogram (O(N), no sort)."""
+    hist = cv2.calcHist([values], [0], None, [256], [0, 256]).ravel()
+    return int(np.searchsorted(np.cumsum(hist), q / 100 * values.size))
+
+
+def _block_means(err, block_size):
+    """Exact block means from an integral image sampled on the block grid."""
+    h, w = err.shape
+    bh, bw = h // block_size, w // block_size
+    if bh == 0 or bw == 0:
+        return np.array([cv2.mean(err)[0]])
+    # float64 sums: the default int32 integral wraps past ~8.4 Mpx of 255 errors
+    s = cv2.integral(err[:bh * block_size, :bw * block_size], sdepth=cv2.CV_64F)[::block_size, ::block_size]
+    sums = s[1:, 1:] - s[:-1, 1:] - s[1:, :-1] + s[:-1, :-1]
+    return sums.ravel() / (block_size * block_size)
+
+
+def _block_outlier_ratio(block_means, z_thresh=3.5):
+    med = np.median(block_means)
+    # floor the MAD at half an error level so flat images do not flag everything
+    mad = max(1.4826 * np.median(np.abs(block_means - med)), 0.5)
+    return float(np.mean((block_means - med) / mad > z_thresh))
+
+
+def ela_analysis(image_bytes, qualities=ELA_QUALITIES, block_size=16, render=False, render_quality=85,
+                 max_side=None):
+    """
+    Multi-quality Error Level Analysis, encoded in memory with cv2.imencode.
+    For each JPEG quality the per-pixel error (max over channels) is
+    summarised as mean / p95 / max plus the share of blocks whose mean
+    error is a robust outlier. The ELA visualization is only built when
+    render=True. max_side downscales the image first (cheap triage pass).
+    Returns {"score", "qualities": {q: stats}, "image": PIL or None}.
+    """
     try:
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        bgr = to_document_image(image_bytes).bgr
     except:
-        return None, 0
+        return {"score": 0, "qualities": {}, "image": None}
 
-    # recompress
-    tmp = io.BytesIO()
-    img.save(tmp, 'JPEG', quality=quality)
-    tmp.seek(0)
-    compressed = Image.open(tmp)
+    if max_side and max(bgr.shape[:2]) > max_side:
+        scale = max_side / max(bgr.shape[:2])
+        bgr = cv2.resize(bgr, (int(bgr.shape[1] * scale), int(bgr.shape[0] * scale)), interpolation=cv2.INTER_AREA)
 
-    # Difference
-    ela_img = ImageChops.difference(img, compressed)
-    extrema = ela_img.getextrema()
+    per_quality = {}
+    scores = []
+    vis = None
+    # render the level closest to the requested one
+    render_q = min(qualities, key=lambda q: abs(q - render_quality)) if qualities else None
+    for q in qualities:
+        ok, enc = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, int(q)])
+        if not ok:
+            continue
+        diff = cv2.imdecode(enc, cv2.IMREAD_COLOR)
+        cv2.absdiff(bgr, diff, dst=diff)
+        if render and q == render_q:
+            # same look as the old 30x brightness enhance
+            vis = cv2.convertScaleAbs(diff, alpha=30)
+        err = cv2.max(cv2.max(diff[:, :, 0], diff[:, :, 1]), diff[:, :, 2])
+        del diff
 
-    # Compute max difference for scoring
-    max_diff = max([ex[1] for ex in extrema])
-    score = min(100, max_diff * 2)  # normalize score
+        p95 = _percentile_u8(err, 95)
+        outlier_ratio = _block_outlier_ratio(_block_means(err, block_size))
+        per_quality[int(q)] = {
+            "mean": float(cv2.mean(err)[0]),
+            "p95": p95,
+            "max": int(cv2.minMaxLoc(err)[1]),
+            "block_outlier_ratio": outlier_ratio,
+        }
+        scores.append(min(100, 2 * p95 + 500 * outlier_ratio))
 
-    # Enhance for visualization
-    enhancer = ImageEnhance.Brightness(ela_img)
-    ela_highlight = enhancer.enhance(30)
+    score = int(round(sum(scores) / len(scores))) if scores else 0
+    image = Image.fromarray(cv2.cvtColor(vis, cv2.COLOR_BGR2RGB)) if vis is not None else None
+    return {"score": score, "qualities": per_quality, "image": image}
 
-    return ela_highlight, score
+
+def perform_ela(image_bytes, quality=85, render=True):
+    """Perform Error Level Analysis and return ELA image + score."""
+    result = ela_analysis(image_bytes, qualities=(quality,), render=render, render_quality=quality)
+    return result["image"], result["score"]
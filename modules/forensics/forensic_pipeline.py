@@ -1,28 +1,293 @@
 # modules/forensics/forensic_pipeline.py
+from modules.forensics.jpeg_analysis import analyze_jpeg_stream
 from modules.forensics.metadata_check import extract_metadata, analyze_metadata
-from modules.forensics.noise_analysis import analyze_noise
-from modules.forensics.ela import perform_ela
-from modules.forensics.tamper_detection import detect_tampering
+from modules.forensics.noise_analysis import analyze_noise, noise_heatmap
+from modules.forensics.ela import ela_analysis
+from modules.forensics.tamper_detection import tamper_mask, generate_heatmap
+from modules.forensics.tiling import tile_size_for_budget
+from modules.forensics.artifacts import register_artifact, register_renderer
+from modules.forensics.duplicates import find_duplicates, record_page
+from core.config import FORENSICS_TRIAGE_BAND, FORENSICS_TRIAGE_ELA_MAX_SIDE, FORENSICS_PAGE_WORKERS
+from core.utils import to_document_image, DocumentImage, iter_frames, iter_bounded
+from core.cache import cached_call
+import numpy as np
+from PIL import Image
+
+# bump when a stage or weighting changes so cached results are recomputed
+FORENSICS_VERSION = "3"
+
+
+def _source(doc):
+    # what a lazy render keeps alive: the compressed upload, or for PIL-built
+    # pages (PDF renders) one pixel array, not the DocumentImage and its views
+    if doc.data is not None:
+        return doc.data, len(doc.data)
+    pixels = doc.gray if doc.pil.mode in ("1", "L") else doc.rgb
+    return Image.fromarray(pixels), pixels.nbytes
+
+
+def _render_ela(source, max_side=None):
+    return ela_analysis(source, qualities=(85,), render=True, max_side=max_side)["image"]
+
+
+def _render_tamper(source, tile_size, copy_move):
+    full = tamper_mask(source, copy_move=copy_move, tile_size=tile_size)[0]
+    return generate_heatmap(full, tile_size=tile_size) if full is not None else None
+
+
+def _render_noise(source, block_size, tile_size):
+    report, z = analyze_noise(source, tile_size=tile_size, block_size=block_size, with_map=True)
+    return noise_heatmap(z, to_document_image(source).gray.shape, block_size) if z is not None else None
+
+
+# lets any process rebuild an artifact from its persisted recipe (artifacts.py)
+register_renderer("ela", _render_ela)
+register_renderer("tamper", _render_tamper)
+register_renderer("noise", _render_noise)
+
+
+def _ela_artifact(doc, max_side=None):
+    # keep only the compressed upload; the ELA view is recomputed on fetch
+    source, retained = _source(doc)
+    return register_artifact(doc.content_hash, "ela", lambda: _render_ela(source, max_side), retained,
+                             source=source, render_params={"max_side": max_side}, max_side=max_side)
+
+
+def _tamper_artifact(doc, tile_size, copy_move, mask=None):
+    # 0/255 mask packed to 1 bit per pixel until someone asks for the heatmap;
+    # without a mask (cache hit) it is recomputed from the upload on fetch
+    source, retained = _source(doc)
+    if mask is None:
+        def render():
+            return _render_tamper(source, tile_size, copy_move)
+    else:
+        h, w = mask.shape
+        packed = np.packbits(mask > 0)
+        retained = packed.nbytes
+
+        def render():
+            full = np.unpackbits(packed, count=h * w).reshape(h, w) * np.uint8(255)
+            return generate_heatmap(full, tile_size=tile_size)
+
+    return register_artifact(doc.content_hash, "tamper", render, retained, source=source,
+                             render_params={"tile_size": tile_size, "copy_move": copy_move}, copy_move=copy_move)
+
+
+def _noise_artifact(doc, block_size, tile_size, z_map=None):
+    source, retained = _source(doc)
+    if z_map is None:
+        def render():
+            return _render_noise(source, block_size, tile_size)
+    else:
+        shape = doc.gray.shape
+        retained = z_map.nbytes
+
+        def render():
+            return noise_heatmap(z_map, shape, block_size)
+
+    return register_artifact(doc.content_hash, "noise", render, retained, source=source,
+                             render_params={"block_size": block_size, "tile_size": tile_size}, block_size=block_size)
+
+
+def _rehydrate_artifacts(doc, result, tile_size, copy_move):
+    """Re-register render callbacks for a cached result; IDs are deterministic."""
+    if result.get("ela_artifact"):
+        full = "ela" in result["stages_run"]
+        _ela_artifact(doc, None if full else FORENSICS_TRIAGE_ELA_MAX_SIDE)
+    if result.get("noise_artifact"):
+        _noise_artifact(doc, result["noise_report"]["block_size"], tile_size)
+    if result.get("tamper_artifact"):
+        _tamper_artifact(doc, tile_size, copy_move)
+
+
+def _record(doc, dup_report, result):
+    # index this page for future lookups; never fail the analysis over it
+    if dup_report and "phash" in dup_report:
+        try:
+            record_page(doc.content_hash, dup_report["phash"], dup_report["dhash"], fraud_score=result["fraud_score"])
+        except:
+            pass
+    return result
+
+
+def analyze_document_forensics(image_bytes, copy_move="block", tile_budget_mb=None, render=True,
+                               triage=False, uncertainty_band=None, dedup=True, use_cache=True):
+    """Runs full hybrid forensic analysis.
+
+    copy_move selects the copy-move detector: "block", "keypoint" or "both".
+    Noise and tamper passes run in halo-overlapped tiles sized to
+    tile_budget_mb (default core.config.FORENSICS_TILE_BUDGET_MB), so their
+    working memory stays bounded on very large scans.
+    Images are never built here: with render=True the ELA view and the
+    heatmaps are registered as lazy artifacts (see artifacts.py) and the
+    result carries their IDs; render=False skips even that (scores only).
+
+    triage=True runs the cheap stages first (JPEG headers, EXIF, downscaled
+    ELA). The full-resolution noise, ELA and tamper stages only run when
+    that cheap risk falls inside uncertainty_band (low, high), default
+    core.config.FORENSICS_TRIAGE_BAND. Missing EXIF fields (normal for
+    scans) do not count toward that risk, only signs of editing do. The
+    risk is reported in "triage" only; an early exit's fraud_score uses the
+    full-mode weights for the stages that ran. "stages_run" lists what ran.
+
+    dedup=True looks the page up in the perceptual-hash index of earlier
+    submissions and records it there; near-duplicates are reported, and
+    only a match with a flagged earlier score adds a penalty.
+
+    Results are cached by upload SHA-256, FORENSICS_VERSION and the
+    options (core.cache); use_cache=False forces a fresh analysis.
+
+    PDFs are routed to pdf_forensics.analyze_pdf_forensics, which analyzes
+    the embedded images in their original encoding plus the file structure.
+    Raises ValueError for input that cannot be decoded as an image.
+    """
+    data = image_bytes.data if isinstance(image_bytes, DocumentImage) else image_bytes
+    if isinstance(data, (bytes, bytearray)) and b"%PDF-" in data[:1024]:
+        from modules.forensics.pdf_forensics import analyze_pdf_forensics  # imports this module
+        return analyze_pdf_forensics(data, copy_move=copy_move, tile_budget_mb=tile_budget_mb, render=render,
+                                     triage=triage, uncertainty_band=uncertainty_band, dedup=dedup,
+                                     use_cache=use_cache)
+
+    # Decode once; every stage shares the same views. Stages degrade to a
+    # zero score on unreadable input, so refuse it here rather than score
+    # (and cache) garbage on its metadata penalty alone.
+    doc = to_document_image(image_bytes)
+    try:
+        doc.gray
+    except Exception as e:
+        raise ValueError(f"Cannot read image: {e}") from e
+    tile_size = tile_size_for_budget(tile_budget_mb)
+    band = tuple(uncertainty_band or FORENSICS_TRIAGE_BAND)
+
+    # Near-duplicate lookup against earlier submissions (never cached: the index grows)
+    dup_report = None
+    if dedup:
+        try:
+            dup_report = find_duplicates(doc.gray, doc.content_hash)
+        except Exception as e:
+            dup_report = {"error": str(e), "matches": [], "near_duplicate": False,
+                          "flagged_match": False, "score_penalty": 0}
+    dup_penalty = dup_report["score_penalty"] if dup_report else 0
+
+    def compute():
+        return _analyze(doc, copy_move, tile_size, render, triage, band, dup_penalty)
+
+    if use_cache:
+        result = cached_call("forensics", FORENSICS_VERSION, doc.content_hash, compute,
+                             copy_move=copy_move, tile_size=tile_size, render=render,
+                             triage=triage, band=band if triage else None, dup_penalty=dup_penalty)
+        if render:
+            _rehydrate_artifacts(doc, result, tile_size, copy_move)
+    else:
+        result = compute()
+
+    result["duplicates_report"] = dup_report
+    if dedup:
+        result["stages_run"] = ["duplicates"] + result["stages_run"]
+    return _record(doc, dup_report, result)
+
+
+def _analyze_frame(doc, page_no, kwargs):
+    # worker: one decoded frame of the bundle
+    try:
+        return {"page": page_no, "forensic": analyze_document_forensics(doc, **kwargs)}
+    except Exception as e:
+        return {"page": page_no, "error": str(e)}
+
+
+def iter_frame_forensics(image_bytes, workers=None, max_in_flight=None, pages=None, **kwargs):
+    """
+    Forensics for every page of a multi-page TIFF (fax bundles), streamed:
+    yields {"page", "forensic"} or {"page", "error"} per page in
+    completion order. Frames come from core.utils.iter_frames, so at most
+    max_in_flight of them are decoded at once. Extra kwargs go to
+    analyze_document_forensics.
+    """
+    yield from iter_bounded(_analyze_frame, ((doc, page_no, kwargs) for page_no, doc in iter_frames(image_bytes, pages)),
+                            workers or FORENSICS_PAGE_WORKERS, max_in_flight)
+
+
+def _analyze(doc, copy_move, tile_size, render, triage, band, dup_penalty):
+    stages = []
+
+    # 0. JPEG stream screening (headers + partial coefficient decode, no pixels)
+    jpeg_report = analyze_jpeg_stream(doc)
+    stages.append("jpeg_stream")
 
-def analyze_document_forensics(image_bytes: bytes):
-    """Runs full hybrid forensic analysis."""
     # 1. Metadata
-    metadata = extract_metadata(image_bytes)
+    metadata = extract_metadata(doc)
     meta_report = analyze_metadata(metadata)
+    stages.append("metadata")
+
+    triage_report = None
+    if triage:
+        low, high = band
+        quick_ela = ela_analysis(doc, max_side=FORENSICS_TRIAGE_ELA_MAX_SIDE)
+        stages.append("ela_downscaled")
+
+        # missing camera EXIF is the norm for scans and would keep every clean
+        # scan above the low threshold, so only editing signs count here
+        risk = min(100, jpeg_report["score_penalty"] + meta_report["edit_penalty"] + dup_penalty
+                   + int(quick_ela["score"] * 0.3))
+        if risk < low:
+            decision = "clean"
+        elif risk >= high:
+            decision = "suspicious"
+        else:
+            decision = "uncertain"
+        triage_report = {"risk": risk, "band": [low, high], "decision": decision}
+
+        if decision != "uncertain":
+            # risk only routes; the score uses the full-mode weights for the
+            # stages that ran, so it means the same with and without triage
+            fraud_score = min(100, jpeg_report["score_penalty"] + meta_report["score_penalty"] + dup_penalty
+                              + int(quick_ela["score"] * 0.3))
+            return {
+                "fraud_score": fraud_score,
+                "stages_run": stages,
+                "triage": triage_report,
+                "jpeg_report": jpeg_report,
+                "metadata_report": meta_report,
+                "noise_report": None,
+                "noise_score": 0,
+                "noise_artifact": None,
+                "ela_score": quick_ela["score"],
+                "ela_stats": quick_ela["qualities"],
+                "ela_artifact": _ela_artifact(doc, FORENSICS_TRIAGE_ELA_MAX_SIDE) if render else None,
+                "tamper_score": 0,
+                "tamper_details": None,
+                "tamper_artifact": None
+            }
 
     # 2. Noise Analysis
-    noise_report = analyze_noise(image_bytes)
+    noise_report, noise_map = analyze_noise(doc, tile_size=tile_size, with_map=True)
+    noise_score = noise_report.get("inconsistency_score", 0)
+    noise_artifact = None
+    if render and noise_map is not None:
+        noise_artifact = _noise_artifact(doc, noise_report["block_size"], tile_size, z_map=noise_map)
+    stages.append("noise")
 
     # 3. ELA
-    ela_img, ela_score = perform_ela(image_bytes)
+    ela = ela_analysis(doc)
+    ela_score = ela["score"]
+    ela_artifact = _ela_artifact(doc) if render and ela["qualities"] else None
+    stages.append("ela")
 
     # 4. Tamper detection
-    tamper_heatmap, tamper_score, tamper_details = detect_tampering(image_bytes)
+    combined_mask, tamper_score, tamper_details = tamper_mask(doc, copy_move=copy_move, tile_size=tile_size)
+    tamper_artifact = None
+    if render and combined_mask is not None:
+        tamper_artifact = _tamper_artifact(doc, tile_size, copy_move, mask=combined_mask)
+    del combined_mask
+    stages.append("tamper")
 
     # Combine scores (weighted)
     total_penalty = (
-        meta_report["score_penalty"]
-        + noise_report["score_penalty"]
+        jpeg_report["score_penalty"]
+        + meta_report["score_penalty"]
+        + dup_penalty
+        + noise_report.get("score_penalty", 0)
+        + int(noise_score * 0.2)
         + int(ela_score * 0.3)
         + int(tamper_score * 0.5)
     )
@@ -31,11 +296,17 @@ def analyze_document_forensics(image_bytes: bytes):
 
     return {
         "fraud_score": fraud_score,
+        "stages_run": stages,
+        "triage": triage_report,
+        "jpeg_report": jpeg_report,
         "metadata_report": meta_report,
         "noise_report": noise_report,
+        "noise_score": noise_score,
+        "noise_artifact": noise_artifact,
         "ela_score": ela_score,
-        "ela_image": ela_img,
+        "ela_stats": ela["qualities"],
+        "ela_artifact": ela_artifact,
         "tamper_score": tamper_score,
         "tamper_details": tamper_details,
-        "tamper_heatmap": tamper_heatmap
+        "tamper_artifact": tamper_artifact
     }
@@ -0,0 +1,494 @@
+# modules/forensics/jpeg_analysis.py
+"""
+JPEG double-compression analysis straight from the compressed stream.
+
+Quantization tables, frame/scan headers and APP markers are parsed from
+the file bytes, and a bounded number of luma DCT blocks are entropy
+decoded (no IDCT of the full image). From these we derive:
+- an IJG quality estimate and whether the tables are standard
+- double-quantization (DQ) artifacts in low-frequency DCT histograms
+- non-aligned recompression: a quantization footprint on an 8x8 grid
+  shifted from the current one, measured on the decoded stripe
+"""
+import numpy as np
+from core.utils import DocumentImage
+
+# zigzag position -> natural (row-major) index
+ZIGZAG = np.array([
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
+    12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63,
+])
+
+# IJG (Annex K) luminance table, natural order
+STD_LUMA_QT = np.array([
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+])
+
+# Low-frequency AC positions (zigzag 1..9) used for DQ histograms
+DQ_ZIGZAG_POSITIONS = range(1, 10)
+
+# Entropy decoding is pure Python, so only this many luma blocks are read
+MAX_DECODE_BLOCKS = 4096
+
+EDITOR_APP_MARKERS = {0xED: "Photoshop IRB (APP13)", 0xEE: "Adobe (APP14)"}
+
+
+def _u16(data, pos):
+    return (data[pos] << 8) | data[pos + 1]
+
+
+def _ijg_table(quality):
+    quality = min(max(int(quality), 1), 100)
+    scale = 5000 / quality if quality < 50 else 200 - 2 * quality
+    return np.clip((STD_LUMA_QT * scale + 50) // 100, 1, 255)
+
+
+def estimate_quality(luma_table):
+    """Closest IJG quality for a luma table; exact=True if it matches bit for bit."""
+    diffs = [np.abs(_ijg_table(q) - luma_table).sum() for q in range(1, 101)]
+    best = int(np.argmin(diffs))
+    return best + 1, diffs[best] == 0
+
+
+class _HuffmanTable:
+    """Canonical JPEG Huffman table with a 9-bit lookahead."""
+
+    LOOKAHEAD = 9
+
+    def __init__(self, counts, symbols):
+        self.codes = {}
+        self.fast = [None] * (1 << self.LOOKAHEAD)
+        code = 0
+        k = 0
+        for length in range(1, 17):
+            for _ in range(counts[length - 1]):
+                sym = symbols[k]
+                k += 1
+                self.codes[(length, code)] = sym
+                if length <= self.LOOKAHEAD:
+                    shift = self.LOOKAHEAD - length
+                    for fill in range(1 << shift):
+                        self.fast[(code << shift) | fill] = (length, sym)
+                code += 1
+            code <<= 1
+
+
+# Annex K.3 Huffman tables (counts per code length, symbols). Motion-JPEG
+# frames omit DHT and rely on these; the tables are built on first use.
+_STD_HUFFMAN_SPECS = {
+    ("dc", 0): ([0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0], list(range(12))),
+    ("dc", 1): ([0, 3, 1, 1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0], list(range(12))),
+    ("ac", 0): ([0, 2, 1, 3, 3, 2, 4, 3, 5, 5, 4, 4, 0, 0, 1, 0x7D], list(bytes.fromhex(
+        "01020300041105122131410613516107227114328191a1082342b1c11552d1f0"
+        "2433627282090a161718191a25262728292a3435363738393a434445464748494a"
+        "535455565758595a636465666768696a737475767778797a838485868788898a"
+        "92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3c4c5c6"
+        "c7c8c9cad2d3d4d5d6d7d8d9dae1e2e3e4e5e6e7e8e9eaf1f2f3f4f5f6f7f8f9fa"))),
+    ("ac", 1): ([0, 2, 1, 2, 4, 4, 3, 4, 7, 5, 4, 4, 0, 1, 2, 0x77], list(bytes.fromhex(
+        "000102031104052131061241510761711322328108144291a1b1c109233352f0"
+        "156272d10a162434e125f11718191a262728292a35363738393a434445464748"
+        "494a535455565758595a636465666768696a737475767778797a828384858687"
+        "88898a92939495969798999aa2a3a4a5a6a7a8a9aab2b3b4b5b6b7b8b9bac2c3"
+        "c4c5c6c7c8c9cad2d3d4d5d6d7d8d9dae2e3e4e5e6e7e8e9eaf2f3f4f5f6f7f8f9fa"))),
+}
+_std_huffman_cache = {}
+
+
+def _huffman_table(tables, kind, tid):
+    """Table `tid` from the stream's DHT segments, else the Annex K default."""
+    table = tables.get(tid)
+    if table is None and (kind, tid) in _STD_HUFFMAN_SPECS:
+        table = _std_huffman_cache.get((kind, tid))
+        if table is None:
+            table = _std_huffman_cache[(kind, tid)] = _HuffmanTable(*_STD_HUFFMAN_SPECS[(kind, tid)])
+    if table is None:
+        raise ValueError(f"Missing {kind.upper()} Huffman table {tid}")
+    return table
+
+
+class _BitReader:
+    """MSB-first reader over entropy-coded data, handling 0xFF00 stuffing and markers."""
+
+    def __init__(self, data, pos):
+        self.data = data
+        self.pos = pos
+        self.acc = 0
+        self.nbits = 0
+        self.marker = None
+
+    def _fill(self, need):
+        data = self.data
+        while self.nbits < need:
+            byte = 0
+            if self.marker is None and self.pos < len(data):
+                byte = data[self.pos]
+                if byte == 0xFF:
+                    nxt = data[self.pos + 1] if self.pos + 1 < len(data) else 0
+                    if nxt == 0x00:
+                        self.pos += 2
+                    else:
+                        # a marker: feed zeros until it is consumed by restart()
+                        self.marker = nxt
+                        byte = 0
+                else:
+                    self.pos += 1
+            self.acc = ((self.acc << 8) | byte) & 0xFFFFFFFFFFFF
+            self.nbits += 8
+
+    def bits(self, n):
+        if n == 0:
+            return 0
+        self._fill(n)
+        self.nbits -= n
+        return (self.acc >> self.nbits) & ((1 << n) - 1)
+
+    def decode(self, table):
+        self._fill(16)
+        peek = (self.acc >> (self.nbits - _HuffmanTable.LOOKAHEAD)) & ((1 << _HuffmanTable.LOOKAHEAD) - 1)
+        hit = table.fast[peek]
+        if hit is not None:
+            self.nbits -= hit[0]
+            return hit[1]
+        code = 0
+        for length in range(1, 17):
+            code = (code << 1) | self.bits(1)
+            sym = table.codes.get((length, code))
+            if sym is not None:
+                return sym
+        raise ValueError("Corrupt Huffman code")
+
+    def receive_extend(self, s):
+        if s == 0:
+            return 0
+        v = self.bits(s)
+        return v if v >= 1 << (s - 1) else v - (1 << s) + 1
+
+    def restart(self):
+        """Drop buffered bits and skip the RSTn marker."""
+        self.acc = self.nbits = 0
+        if self.marker is not None and 0xD0 <= self.marker <= 0xD7:
+            self.pos += 2
+            self.marker = None
+        elif self.marker is None:
+            # tolerate a restart marker that has not been reached by _fill yet
+            while self.pos + 1 < len(self.data):
+                if self.data[self.pos] == 0xFF and 0xD0 <= self.data[self.pos + 1] <= 0xD7:
+                    self.pos += 2
+                    break
+                self.pos += 1
+
+
+def parse_jpeg(data, max_blocks=MAX_DECODE_BLOCKS):
+    """
+    Parse JPEG headers and entropy-decode up to max_blocks luma blocks of the
+    first baseline scan. Luma blocks are returned in raster order as
+    quantized coefficients (natural order), shape (rows, cols, 64).
+    Raises ValueError for non-JPEG or unsupported streams.
+    """
+    if data[:2] != b"\xff\xd8":
+        raise ValueError("Not a JPEG stream")
+
+    qtables, dc_tables, ac_tables = {}, {}, {}
+    frame = None
+    restart_interval = 0
+    app_markers = []
+    pos = 2
+
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            pos += 1
+            continue
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        if marker == 0xD9:
+            break
+
+        length = _u16(data, pos + 2)
+        seg = data[pos + 4:pos + 2 + length]
+
+        if marker == 0xDB:
+            i = 0
+            while i < len(seg):
+                precision, tid = seg[i] >> 4, seg[i] & 15
+                n = 128 if precision else 64
+                raw = np.frombuffer(seg[i + 1:i + 1 + n], dtype=">u2" if precision else np.uint8).astype(np.int32)
+                table = np.zeros(64, dtype=np.int32)
+                table[ZIGZAG] = raw
+                qtables[tid] = table
+                i += 1 + n
+        elif marker in (0xC0, 0xC1, 0xC2):
+            height, width = _u16(seg, 1), _u16(seg, 3)
+            comps = []
+            for c in range(seg[5]):
+                cid, hv, tq = seg[6 + 3 * c], seg[7 + 3 * c], seg[8 + 3 * c]
+                comps.append({"id": cid, "h": hv >> 4, "v": hv & 15, "tq": tq})
+            frame = {"width": width, "height": height, "components": comps, "progressive": marker == 0xC2}
+        elif 0xC3 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            raise ValueError("Unsupported JPEG process (lossless/arithmetic)")
+        elif marker == 0xC4:
+            i = 0
+            while i < len(seg):
+                tc, th = seg[i] >> 4, seg[i] & 15
+                counts = list(seg[i + 1:i + 17])
+                total = sum(counts)
+                table = _HuffmanTable(counts, list(seg[i + 17:i + 17 + total]))
+                (ac_tables if tc else dc_tables)[th] = table
+                i += 17 + total
+        elif marker == 0xDD:
+            restart_interval = _u16(seg, 0)
+        elif 0xE0 <= marker <= 0xEF:
+            app_markers.append((marker, bytes(seg[:32])))
+        elif marker == 0xDA:
+            result = {
+                "frame": frame,
+                "qtables": qtables,
+                "app_markers": app_markers,
+                "luma_blocks": None,
+            }
+            if frame is None:
+                raise ValueError("Scan before frame header")
+            if not frame["progressive"]:
+                result["luma_blocks"] = _decode_scan(data, pos + 2 + length, seg, frame,
+                                                     dc_tables, ac_tables, restart_interval, max_blocks)
+            return result
+
+        pos += 2 + length
+
+    raise ValueError("No scan found in JPEG stream")
+
+
+def _decode_scan(data, start, sos, frame, dc_tables, ac_tables, restart_interval, max_blocks):
+    comps_by_id = {c["id"]: c for c in frame["components"]}
+    scan = []
+    for i in range(sos[0]):
+        cid, tables = sos[1 + 2 * i], sos[2 + 2 * i]
+        scan.append((comps_by_id[cid], _huffman_table(dc_tables, "dc", tables >> 4),
+                     _huffman_table(ac_tables, "ac", tables & 15)))
+
+    luma = frame["components"][0]
+    if all(c is not luma for c, _, _ in scan):
+        return None
+
+    hmax = max(c["h"] for c in frame["components"])
+    vmax = max(c["v"] for c in frame["components"])
+    if len(scan) == 1:
+        # non-interleaved: one block per MCU over the component's own grid
+        cw = -(-frame["width"] * luma["h"] // hmax)
+        units = [(luma, 1, 1)]
+        mcus_x = -(-cw // 8)
+        blocks_x = mcus_x
+    else:
+        units = [(c, c["h"], c["v"]) for c, _, _ in scan]
+        mcus_x = -(-frame["width"] // (8 * hmax))
+        blocks_x = mcus_x * luma["h"]
+    tables = {id(c): (dc, ac) for c, dc, ac in scan}
+
+    lh, lv = (1, 1) if len(scan) == 1 else (luma["h"], luma["v"])
+    if len(scan) == 1:
+        total_rows = -(-(-(-frame["height"] * luma["v"] // vmax)) // 8)
+    else:
+        total_rows = -(-frame["height"] // (8 * vmax))
+    max_mcu_rows = min(total_rows, max(1, max_blocks // (blocks_x * lv)))
+    rows = []
+    reader = _BitReader(data, start)
+    preds = {id(c): 0 for c, _, _ in scan}
+    mcu = 0
+
+    for _ in range(max_mcu_rows):
+        row = np.zeros((lv, blocks_x, 64), dtype=np.int32)
+        for mx in range(mcus_x):
+            if restart_interval and mcu and mcu % restart_interval == 0:
+                reader.restart()
+                preds = dict.fromkeys(preds, 0)
+            for comp, nh, nv in units:
+                dc, ac = tables[id(comp)]
+                for by in range(nv):
+                    for bx in range(nh):
+                        coefs = _decode_block(reader, dc, ac, preds, id(comp))
+                        if comp is luma:
+                            row[by, mx * lh + bx, ZIGZAG] = coefs
+            mcu += 1
+        if reader.marker is None and reader.pos >= len(data):
+            # truncated stream: this row was padded with zero bits
+            break
+        rows.append(row)
+        if reader.marker is not None and not 0xD0 <= reader.marker <= 0xD7:
+            break
+
+    if not rows:
+        return None
+
+    return np.concatenate(rows, axis=0)
+
+
+def _decode_block(reader, dc, ac, preds, key):
+    coefs = [0] * 64
+    preds[key] += reader.receive_extend(reader.decode(dc))
+    coefs[0] = preds[key]
+    k = 1
+    while k < 64:
+        rs = reader.decode(ac)
+        r, s = rs >> 4, rs & 15
+        if s == 0:
+            if r != 15:
+                break
+            k += 16
+            continue
+        k += r
+        if k > 63:
+            break
+        coefs[k] = reader.receive_extend(s)
+        k += 1
+    return coefs
+
+
+def dq_score(luma_blocks, max_value=24):
+    """
+    Double-quantization artifacts in low-frequency AC histograms.
+    Re-quantizing with a different step leaves periodically empty or
+    boosted bins; we measure how far each histogram deviates from its own
+    3-bin moving average (a smooth, single-compression shape stays near 0).
+    """
+    coeffs = luma_blocks.reshape(-1, 64)
+    scores = []
+    for zz in DQ_ZIGZAG_POSITIONS:
+        v = np.abs(coeffs[:, ZIGZAG[zz]])
+        v = v[(v > 0) & (v <= max_value)]
+        if v.size < 200:
+            continue
+        hist = np.bincount(v, minlength=max_value + 1)[1:].astype(np.float64)
+        # only bins with enough mass carry a reliable shape
+        support = hist >= max(5, 0.01 * hist.sum())
+        if support.sum() < 4:
+            continue
+        last = np.nonzero(support)[0][-1] + 1
+        h = hist[:last] + 1
+        smooth = np.convolve(np.pad(h, 1, mode="edge"), np.ones(3) / 3, mode="valid")
+        scores.append(float(np.mean(np.abs(np.log(h / smooth)))))
+    return float(np.median(scores)) if scores else 0.0
+
+
+def _dct_matrix():
+    """Orthonormal 8-point DCT-II matrix: F = M @ f @ M.T, f = M.T @ F @ M."""
+    i = np.arange(8)
+    m = np.cos(np.pi * (2 * i[None, :] + 1) * i[:, None] / 16)
+    m[0] /= np.sqrt(2)
+    return (m * 0.5).astype(np.float32)
+
+
+# DCT positions with u + v >= 6: zeroed by quantization on the grid that compressed them
+_HIGH_FREQ = np.add.outer(np.arange(8), np.arange(8)) >= 6
+
+
+def grid_alignment(luma_blocks, qtable):
+    """
+    Reconstruct the decoded luma stripe and look for a second 8x8 grid.
+    For each of the 64 grid shifts we measure mean |high-frequency DCT|;
+    quantization leaves a dip on every grid that was ever used to compress
+    the image. The current grid is (0, 0); shifts sharing a row or column
+    with it are only compared among themselves, since they are half-aligned.
+    Returns {"offset": [dy, dx], "strength": relative dip below the median}.
+    """
+    rows, cols = luma_blocks.shape[:2]
+    if rows < 3 or cols < 3:
+        return {"offset": [0, 0], "strength": 0.0}
+
+    m = _dct_matrix()
+    coef = (luma_blocks * qtable.reshape(64)).reshape(rows, cols, 8, 8).astype(np.float32)
+    pix = (m.T @ coef @ m).transpose(0, 2, 1, 3).reshape(rows * 8, cols * 8)
+
+    r, c = rows - 1, cols - 1
+    energy = np.zeros((8, 8))
+    for dy in range(8):
+        for dx in range(8):
+            b = pix[dy:dy + 8 * r, dx:dx + 8 * c].reshape(r, 8, c, 8).transpose(0, 2, 1, 3)
+            energy[dy, dx] = np.abs((m @ b @ m.T)[:, :, _HIGH_FREQ]).mean()
+
+    yy, xx = np.mgrid[:8, :8]
+    best = {"offset": [0, 0], "strength": 0.0}
+    for cls in ((yy == 0) & (xx > 0), (xx == 0) & (yy > 0), (yy > 0) & (xx > 0)):
+        vals = energy[cls]
+        med = np.median(vals)
+        strength = float((med - vals.min()) / (med + 1e-6))
+        if strength > best["strength"]:
+            k = int(np.argmin(vals))
+            best = {"offset": [int(yy[cls][k]), int(xx[cls][k])], "strength": strength}
+    return best
+
+
+def analyze_jpeg_stream(image_bytes, max_blocks=MAX_DECODE_BLOCKS):
+    """
+    Cheap first-stage JPEG screening from the compressed stream.
+    Returns a report with quality estimate, DQ / non-aligned scores and a
+    score_penalty in the same style as the other forensic reports.
+    """
+    data = image_bytes.data if isinstance(image_bytes, DocumentImage) else image_bytes
+    if not data or data[:2] != b"\xff\xd8":
+        return {"is_jpeg": False, "issues": [], "score_penalty": 0}
+
+    try:
+        parsed = parse_jpeg(data, max_blocks=max_blocks)
+    except (ValueError, IndexError, KeyError) as e:
+        return {"is_jpeg": True, "issues": [f"Cannot parse JPEG stream: {e}"], "score_penalty": 0}
+
+    frame = parsed["frame"]
+    luma_tq = frame["components"][0]["tq"]
+    luma_table = parsed["qtables"].get(luma_tq)
+
+    issues = []
+    penalty = 0
+    report = {
+        "is_jpeg": True,
+        "width": frame["width"],
+        "height": frame["height"],
+        "progressive": frame["progressive"],
+    }
+
+    if luma_table is not None:
+        quality, standard = estimate_quality(luma_table)
+        report["quality_estimate"] = quality
+        report["standard_tables"] = bool(standard)
+        # cameras and scanners routinely ship their own tables, so on its own
+        # this is informational; it only counts together with the DQ signal below
+
+    editors = [EDITOR_APP_MARKERS[m] for m, _ in parsed["app_markers"] if m in EDITOR_APP_MARKERS]
+    report["editor_markers"] = editors
+    if editors:
+        issues.append("Editing-software markers: " + ", ".join(editors))
+        penalty += 15
+
+    blocks = parsed["luma_blocks"]
+    if blocks is not None and luma_table is not None:
+        dq = dq_score(blocks)
+        align = grid_alignment(blocks, luma_table)
+        report["decoded_blocks"] = int(blocks.shape[0] * blocks.shape[1])
+        report["double_compression_score"] = round(dq, 4)
+        report["grid_offset"] = align["offset"]
+        report["misaligned_grid_strength"] = round(align["strength"], 4)
+        if dq > 0.5:
+            issues.append("DCT histograms show double-quantization artifacts — recompressed JPEG")
+            penalty += 20
+            if not report.get("standard_tables", True):
+                issues.append("Recompressed with non-standard quantization tables — editor or custom encoder")
+                penalty += 10
+        if align["strength"] > 0.12:
+            issues.append("Compression footprint on a shifted 8x8 grid — cropped and recompressed")
+            penalty += 20
+
+    report["issues"] = issues
+    report["score_penalty"] = penalty
+    return report
@@ -1,15 +1,13 @@
 # modules/forensics/metadata_check.py
-from PIL import Image
 from PIL.ExifTags import TAGS
-import io
+from core.utils import to_document_image
 
 SUSPICIOUS_SOFTWARE = ["Photoshop", "GIMP", "Snapseed", "PicsArt", "PixelLab"]
 
-def extract_metadata(image_bytes: bytes):
-    """Extract EXIF metadata as a readable dict."""
+def extract_metadata(image_bytes):
+    """Extract EXIF metadata as a readable dict (bytes or DocumentImage)."""
     try:
-        img = Image.open(io.BytesIO(image_bytes))
-        exif_data = img.getexif()
+        exif_data = to_document_image(image_bytes).exif
     except Exception:
         return {"error": "Cannot read EXIF metadata"}
 
@@ -22,12 +20,17 @@ def extract_metadata(image_bytes: bytes):
 
 
 def analyze_metadata(metadata: dict):
-    """Detect suspicious EXIF signs."""
+    """Detect suspicious EXIF signs.
+
+    edit_penalty is the part of score_penalty that comes from signs of
+    editing; missing fields (normal for scans) only add to score_penalty.
+    """
     if "error" in metadata:
         return {
             "metadata_valid": False,
             "issues": ["No EXIF metadata found"],
-            "score_penalty": 40
+            "score_penalty": 40,
+            "edit_penalty": 0
         }
 
     issues = []
@@ -38,6 +41,7 @@ def analyze_metadata(metadata: dict):
     if any(sw.lower() in software for sw in SUSPICIOUS_SOFTWARE):
         issues.append(f"Edited using software: {software}")
         penalty += 40
+    edit_penalty = penalty
 
     # 2. Missing timestamps
     if "DateTime" not in metadata:
@@ -52,5 +56,6 @@ def analyze_metadata(metadata: dict):
     return {
         "metadata_valid": len(issues) == 0,
         "issues": issues,
-        "score_penalty": penalty
+        "score_penalty": penalty,
+        "edit_penalty": edit_penalty
     }
@@ -0,0 +1,216 @@
+# modules/forensics/pdf_forensics.py
+"""
+PDF forensics without rasterizing pages.
+
+Embedded image XObjects are pulled out in their original encoding (the
+raw JPEG stream of a scan, not a 180 DPI re-render) and go through the
+regular image pipeline, so JPEG-stream, ELA, noise and tamper analysis
+see the bytes the scanner or editor actually wrote. The file structure
+is checked separately from the raw bytes: incremental updates, edits
+after a signature, producer / creator and date metadata, scripts.
+PyMuPDF is optional: without it only the structure checks run.
+"""
+import re
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf  # PyMuPDF < 1.24
+    except ImportError:
+        pymupdf = None
+
+from modules.forensics.forensic_pipeline import analyze_document_forensics
+from modules.forensics.metadata_check import SUSPICIOUS_SOFTWARE
+from core.config import FORENSICS_PAGE_WORKERS, PDF_FORENSICS_MIN_IMAGE_SIDE, PDF_FORENSICS_MAX_IMAGES
+from core.utils import iter_bounded
+
+# online editors / PDF editors that rewrite documents after they were issued
+PDF_EDITORS = SUSPICIOUS_SOFTWARE + [
+    "iLovePDF", "Smallpdf", "PDFescape", "Sejda", "PDF-XChange", "PhantomPDF", "Nitro",
+    "PDFelement", "Canva", "pdfFiller", "DocFly", "Inkscape", "LibreOffice Draw",
+]
+
+_BYTE_RANGE = re.compile(rb"/ByteRange\s*\[\s*(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s*\]")
+_INFO_FIELD = re.compile(rb"/(Producer|Creator|CreationDate|ModDate)\s*\(((?:\\.|[^\\)])*)\)")
+_EOF = re.compile(rb"%%EOF")
+# objects that change what a page shows; a DSS / document timestamp revision has none
+_CONTENT_EDIT = re.compile(rb"/Type\s*/Page\b|/Subtype\s*/(?:Image|Form|FreeText|Text|Stamp|Ink|Square|Line)\b")
+
+
+def _pdf_date(value):
+    # D:YYYYMMDDHHmmSS... -> YYYYMMDDHHmmSS (comparable as a string)
+    digits = re.sub(r"\D", "", value or "")
+    return digits[:14] or None
+
+
+def _metadata(data):
+    if pymupdf is not None:
+        try:
+            with pymupdf.open(stream=data, filetype="pdf") as doc:
+                meta = doc.metadata or {}
+            return {"producer": meta.get("producer") or "", "creator": meta.get("creator") or "",
+                    "creation_date": meta.get("creationDate") or "", "mod_date": meta.get("modDate") or ""}
+        except Exception:
+            pass
+    # Info dictionary straight from the bytes; last occurrence wins (incremental updates)
+    found = {}
+    for key, value in _INFO_FIELD.findall(data):
+        found[key.decode()] = value.decode("latin-1", "replace")
+    return {"producer": found.get("Producer", ""), "creator": found.get("Creator", ""),
+            "creation_date": found.get("CreationDate", ""), "mod_date": found.get("ModDate", "")}
+
+
+def analyze_pdf_structure(data: bytes) -> dict:
+    """Structure signals read from the raw PDF bytes, as a report with a score_penalty."""
+    issues = []
+    penalty = 0
+
+    # every save appends a new xref section and %%EOF; a linearized file has one extra
+    eof_count = data.count(b"%%EOF")
+    linearized = b"/Linearized" in data[:2048]
+
+    # signing is itself an incremental save and earlier signatures never reach
+    # EOF, so only revisions after the last signed byte range count as edits;
+    # revisions that only add validation data (DSS, document timestamps) are allowed
+    signed_ends = [int(m.group(3)) + int(m.group(4)) for m in _BYTE_RANGE.finditer(data)]
+    signed = bool(signed_ends)
+    ltv_revisions = 0
+    if signed:
+        start = max(signed_ends)
+        revisions = []
+        for m in _EOF.finditer(data, start):
+            revisions.append(data[start:m.end()])
+            start = m.end()
+        if data[start:].strip():
+            revisions.append(data[start:])
+        updates = 0
+        for rev in revisions:
+            if (b"/DSS" in rev or b"/DocTimeStamp" in rev) and not _CONTENT_EDIT.search(rev):
+                ltv_revisions += 1
+            else:
+                updates += 1
+        if updates:
+            issues.append(f"Content appended after a digital signature ({updates} revision(s))")
+            penalty += 40
+    else:
+        updates = max(0, eof_count - 1 - (1 if linearized else 0))
+        if updates:
+            issues.append(f"{updates} incremental update(s) after the original save")
+            penalty += min(25, 10 * updates)
+
+    meta = _metadata(data)
+    tools = f"{meta['producer']} {meta['creator']}".lower()
+    editor = next((e for e in PDF_EDITORS if e.lower() in tools), None)
+    if editor:
+        issues.append(f"Produced or edited with {editor}")
+        penalty += 20
+
+    # signing rewrites ModDate, so the date check is only meaningful unsigned
+    created, modified = _pdf_date(meta["creation_date"]), _pdf_date(meta["mod_date"])
+    if not signed and created and modified and modified[:12] > created[:12]:
+        issues.append("Modified after creation")
+        penalty += 5
+
+    scripted = any(k in data for k in (b"/JavaScript", b"/Launch"))
+    if scripted:
+        issues.append("Contains JavaScript or launch actions")
+        penalty += 5
+
+    return {
+        "incremental_updates": updates,
+        "linearized": linearized,
+        "signed": signed,
+        "signatures": len(signed_ends),
+        "ltv_revisions": ltv_revisions,
+        "scripted": scripted,
+        "metadata": meta,
+        "issues": issues,
+        "score_penalty": penalty,
+    }
+
+
+def iter_pdf_images(data: bytes, min_side=PDF_FORENSICS_MIN_IMAGE_SIDE, max_images=PDF_FORENSICS_MAX_IMAGES):
+    """
+    Lazily yield {"page", "xref", "ext", "width", "height", "data"} for
+    embedded images in their original encoding (each XObject once, even
+    when several pages reuse it). Icons and logos below min_side are skipped.
+    """
+    if pymupdf is None:
+        return
+    seen, count = set(), 0
+    with pymupdf.open(stream=data, filetype="pdf") as doc:
+        for page in doc:
+            for img in page.get_images(full=True):
+                xref = img[0]
+                if xref in seen:
+                    continue
+                seen.add(xref)
+                if min(img[2], img[3]) < min_side:
+                    continue
+                try:
+                    info = doc.extract_image(xref)
+                except Exception:
+                    continue
+                if not info or not info.get("image"):
+                    continue
+                yield {"page": page.number + 1, "xref": xref, "ext": info["ext"],
+                       "width": info["width"], "height": info["height"], "data": info["image"]}
+                count += 1
+                if count >= max_images:
+                    return
+
+
+def _analyze_image(meta, kwargs):
+    entry = {k: v for k, v in meta.items() if k != "data"}
+    try:
+        forensic = analyze_document_forensics(meta["data"], **kwargs)
+    except Exception as e:
+        entry["error"] = str(e)
+        return entry
+    # embedded streams never carry camera EXIF; document metadata is judged
+    # by analyze_pdf_structure instead
+    entry["image_score"] = max(0, forensic["fraud_score"] - forensic["metadata_report"]["score_penalty"])
+    entry["forensic"] = forensic
+    return entry
+
+
+def analyze_pdf_forensics(data: bytes, workers=None, max_in_flight=None, **kwargs) -> dict:
+    """
+    Forensics for a PDF: structure report plus the image pipeline on every
+    embedded image (kwargs go to analyze_document_forensics). The result
+    has the usual top-level fields of the highest-risk image, a combined
+    fraud_score and a "pdf_report" with the structure and per-image results.
+    """
+    structure = analyze_pdf_structure(data)
+    extraction = "pymupdf" if pymupdf is not None else "unavailable (PyMuPDF not installed)"
+    images = []
+    try:
+        for entry in iter_bounded(_analyze_image, ((meta, kwargs) for meta in iter_pdf_images(data)),
+                                  workers or FORENSICS_PAGE_WORKERS, max_in_flight):
+            images.append(entry)
+    except Exception as e:
+        # damaged file: keep the structure report and whatever images were read
+        extraction = f"failed: {e}"
+    images.sort(key=lambda e: (e["page"], e["xref"]))
+
+    scored = [e for e in images if "forensic" in e]
+    worst = max(scored, key=lambda e: e["image_score"]) if scored else None
+    if worst is not None:
+        result = dict(worst["forensic"])
+    else:
+        result = {"jpeg_report": None, "metadata_report": None, "noise_report": None, "noise_score": 0,
+                  "noise_artifact": None, "ela_score": 0, "ela_stats": None, "ela_artifact": None,
+                  "tamper_score": 0, "tamper_details": None, "tamper_artifact": None, "triage": None,
+                  "stages_run": []}
+
+    result["fraud_score"] = min(100, structure["score_penalty"] + (worst["image_score"] if worst else 0))
+    result["stages_run"] = ["pdf_structure", "pdf_images"] + result["stages_run"]
+    result["pdf_report"] = {
+        "structure": structure,
+        "images": images,
+        "images_analyzed": len(scored),
+        "worst_image": {"page": worst["page"], "xref": worst["xref"]} if worst else None,
+        "image_extraction": extraction,
+    }
+    return result
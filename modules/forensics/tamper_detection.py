@@ -2,98 +2,384 @@
 import numpy as np
 import cv2
 from PIL import Image
-import io
+from core.utils import to_document_image
+from modules.forensics.tiling import iter_tiles
 
 
-def generate_heatmap(mask):
-    """Convert mask to color heatmap (red = suspicious)."""
-    heatmap = cv2.applyColorMap(mask.astype(np.uint8), cv2.COLORMAP_JET)
-    heatmap = cv2.cvtColor(heatmap, cv2.COLOR_BGR2RGB)
+def generate_heatmap(mask, tile_size=None):
+    """Convert mask to color heatmap (red = suspicious), stitched tile by tile."""
+    mask = mask.astype(np.uint8, copy=False)
+    h, w = mask.shape
+    heatmap = np.empty((h, w, 3), dtype=np.uint8)
+    for core, _, _ in iter_tiles(h, w, tile_size):
+        tile = cv2.applyColorMap(mask[core], cv2.COLORMAP_JET)
+        heatmap[core] = cv2.cvtColor(tile, cv2.COLOR_BGR2RGB)
     return Image.fromarray(heatmap)
 
 
-def block_hash(img_gray, block_size=16):
+# Fixed random weights for the vectorized "exact" block hash (uint64, wraps on overflow)
+_HASH_WEIGHTS = np.random.default_rng(0x5EED).integers(1, 2**63, size=64 * 64, dtype=np.uint64) | np.uint64(1)
+
+# Max blocks featurized at once; bounds the temporary float32 block copies
+FEATURE_CHUNK_BLOCKS = 65536
+
+
+def _dct_basis(n, k):
+    """First k rows of the orthonormal DCT-II matrix of size n."""
+    i = np.arange(n)
+    basis = np.cos(np.pi * (2 * i[None, :] + 1) * np.arange(k)[:, None] / (2 * n))
+    basis[0] /= np.sqrt(2)
+    return (basis * np.sqrt(2.0 / n)).astype(np.float32)
+
+
+def block_features(img_gray, block_size=16, stride=None, method="exact",
+                   quant=4.0, n_coeffs=4, min_std=0.0):
     """
-    Simple block-hash based copy-move detection.
-    Divides image into blocks, hashes blocks, finds duplicates.
+    Vectorized per-block signatures over a strided window view.
+
+    method:
+        "exact"   -> 64-bit hash of the raw pixels (bit-exact duplicates)
+        "dct"     -> quantized low-frequency DCT coefficients (n_coeffs x n_coeffs)
+        "meanvar" -> quantized quadrant means + standard deviation
+    Returns (features[N, d] int64, coords[N, 2] as (y, x)). Blocks whose
+    standard deviation is below min_std (flat paper background) are dropped.
     """
+    if method == "meanvar" and block_size < 2:
+        raise ValueError("meanvar block features need block_size >= 2")
+    stride = stride or block_size
     h, w = img_gray.shape
-    blocks = {}
-    matches = np.zeros((h, w), dtype=np.uint8)
-
-    for y in range(0, h - block_size, block_size):
-        for x in range(0, w - block_size, block_size):
-            block = img_gray[y:y+block_size, x:x+block_size]
-            b_hash = hash(block.tobytes())
-
-            if b_hash in blocks:
-                # Mark suspicious blocks
-                matches[y:y+block_size, x:x+block_size] = 255
-                prev_y, prev_x = blocks[b_hash]
-                matches[prev_y:prev_y+block_size, prev_x:prev_x+block_size] = 255
+    if h < block_size or w < block_size:
+        return np.empty((0, 1), np.int64), np.empty((0, 2), np.int64)
+
+    win = np.lib.stride_tricks.sliding_window_view(img_gray, (block_size, block_size))[::stride, ::stride]
+    ny, nx = win.shape[:2]
+    rows_per_chunk = max(1, FEATURE_CHUNK_BLOCKS // nx)
+    dct = _dct_basis(block_size, n_coeffs) if method == "dct" else None
+    half = block_size // 2
+
+    feats, keep = [], []
+    for r0 in range(0, ny, rows_per_chunk):
+        chunk = win[r0:r0 + rows_per_chunk].reshape(-1, block_size, block_size)
+
+        if method == "exact":
+            flat = chunk.reshape(len(chunk), -1).astype(np.uint64)
+            f = (flat @ _HASH_WEIGHTS[:flat.shape[1]]).view(np.int64)[:, None]
+        else:
+            blk = chunk.astype(np.float32)
+            if method == "dct":
+                coeffs = dct @ blk @ dct.T
+                f = np.rint(coeffs.reshape(len(blk), -1) / quant).astype(np.int64)
+            elif method == "meanvar":
+                # explicit slices: for odd sizes the middle row / column joins the second half
+                quads = np.stack([blk[:, :half, :half].mean(axis=(1, 2)), blk[:, :half, half:].mean(axis=(1, 2)),
+                                  blk[:, half:, :half].mean(axis=(1, 2)), blk[:, half:, half:].mean(axis=(1, 2))], 1)
+                std = blk.std(axis=(1, 2))[:, None]
+                f = np.rint(np.hstack([quads, std]) / quant).astype(np.int64)
             else:
-                blocks[b_hash] = (y, x)
+                raise ValueError(f"Unknown block feature method: {method}")
+
+        if min_std > 0:
+            keep.append(chunk.reshape(len(chunk), -1).std(axis=1) >= min_std)
+        feats.append(f)
+
+    features = np.concatenate(feats)
+    yy, xx = np.meshgrid(np.arange(ny) * stride, np.arange(nx) * stride, indexing="ij")
+    coords = np.stack([yy.ravel(), xx.ravel()], axis=1)
+
+    if keep:
+        mask = np.concatenate(keep)
+        features, coords = features[mask], coords[mask]
+    return features, coords
+
+
+def match_blocks(features, coords, min_shift=0, min_shift_count=1):
+    """
+    Find blocks with identical signatures via a lexicographic sort.
+    Every block in a run of equal features is paired with the run's first
+    block. Pairs closer than min_shift pixels are dropped (overlapping
+    neighbours), as are shift vectors seen fewer than min_shift_count times.
+    Returns (pairs[M, 4] as (y1, x1, y2, x2), shifts[M, 2] as (dy, dx)).
+    """
+    if len(features) < 2:
+        return np.empty((0, 4), np.int64), np.empty((0, 2), np.int64)
+
+    order = np.lexsort(features.T[::-1])
+    sorted_f = features[order]
+    same = np.all(sorted_f[1:] == sorted_f[:-1], axis=1)
+    run_start = np.concatenate([[True], ~same])
+
+    # index (into the sorted order) of the first member of each block's run
+    anchor = np.maximum.accumulate(np.where(run_start, np.arange(len(order)), 0))
+    dup = ~run_start
+    src = coords[order[anchor[dup]]]
+    dst = coords[order[dup]]
+
+    shifts = dst - src
+    ok = np.abs(shifts).max(axis=1) >= min_shift
+    src, dst, shifts = src[ok], dst[ok], shifts[ok]
+
+    if min_shift_count > 1 and len(shifts):
+        _, inverse, counts = np.unique(shifts, axis=0, return_inverse=True, return_counts=True)
+        ok = counts[inverse.ravel()] >= min_shift_count
+        src, dst, shifts = src[ok], dst[ok], shifts[ok]
+
+    return np.hstack([src, dst]), shifts
+
+
+def paint_blocks(shape, corners, block_size, cell=1):
+    """
+    Rasterize (y, x) block corners into a 0/255 mask.
+    Coverage is accumulated with a 2-D difference array on a grid of
+    `cell`-pixel cells (corners and block_size must be multiples of cell),
+    so the int32 scratch is (H/cell) x (W/cell) rather than full resolution.
+    """
+    h, w = shape
+    if len(corners) == 0:
+        return np.zeros((h, w), dtype=np.uint8)
+
+    gh, gw = -(-h // cell), -(-w // cell)
+    span = block_size // cell
+    diff = np.zeros((gh + 1, gw + 1), dtype=np.int32)
+    y, x = corners[:, 0] // cell, corners[:, 1] // cell
+    y2, x2 = np.minimum(y + span, gh), np.minimum(x + span, gw)
+    np.add.at(diff, (y, x), 1)
+    np.add.at(diff, (y, x2), -1)
+    np.add.at(diff, (y2, x), -1)
+    np.add.at(diff, (y2, x2), 1)
+    np.cumsum(diff, axis=0, out=diff)
+    np.cumsum(diff, axis=1, out=diff)
+
+    grid = np.where(diff[:gh, :gw] > 0, 255, 0).astype(np.uint8)
+    if cell > 1:
+        grid = grid.repeat(cell, axis=0).repeat(cell, axis=1)
+    return np.ascontiguousarray(grid[:h, :w])
+
+
+def find_copy_move(img_gray, block_size=16, stride=None, method="exact",
+                   min_std=0.0, min_shift=None, min_shift_count=1, **feature_kwargs):
+    """
+    Vectorized block-matching copy-move detector.
+    Returns {"mask", "pairs", "shifts"}; see block_features / match_blocks.
+    """
+    stride = stride or block_size
+    features, coords = block_features(img_gray, block_size, stride, method,
+                                      min_std=min_std, **feature_kwargs)
+    if min_shift is None:
+        min_shift = block_size
+    pairs, shifts = match_blocks(features, coords, min_shift, min_shift_count)
+    corners = np.vstack([pairs[:, :2], pairs[:, 2:]])
+    return {
+        "mask": paint_blocks(img_gray.shape, corners, block_size, cell=int(np.gcd(stride, block_size))),
+        "pairs": pairs,
+        "shifts": shifts,
+    }
+
+
+def block_hash(img_gray, block_size=16, stride=None, method="exact"):
+    """
+    Block-hash based copy-move detection.
+    Hashes every block (non-overlapping by default) and marks duplicates.
+    """
+    return find_copy_move(img_gray, block_size, stride, method)["mask"]
+
 
-    return matches
+FLANN_INDEX_LSH = 6
 
 
-def detect_edges_inconsistency(img_gray):
-    """Detect sharp inconsistencies (possible splicing)."""
-    lap = cv2.Laplacian(img_gray, cv2.CV_64F)
-    lap_abs = np.abs(lap)
+def _keypoint_detector(detector, n_features):
+    if detector == "akaze":
+        return cv2.AKAZE_create()
+    if detector == "orb":
+        return cv2.ORB_create(nfeatures=n_features)
+    raise ValueError(f"Unknown keypoint detector: {detector}")
 
-    # Normalize to 0–255
-    if lap_abs.max() != 0:
-        lap_norm = (lap_abs / lap_abs.max()) * 255
-    else:
-        lap_norm = lap_abs
 
-    thresh = np.where(lap_norm > 180, 255, 0).astype(np.uint8)
+def keypoint_copy_move(img_gray, detector="orb", n_features=5000, ratio=0.6,
+                       min_distance=24, min_region_matches=4, max_regions=8,
+                       ransac_thresh=4.0):
+    """
+    Keypoint copy-move detection (rotation/scale/recompression tolerant).
+    Binary descriptors are self-matched through a FLANN LSH index with a
+    2nd/3rd-neighbour ratio test; matched pairs are then clustered into
+    cloned regions by repeated RANSAC similarity fits.
+    Returns {"mask", "pairs" (y1, x1, y2, x2), "regions"}.
+    """
+    h, w = img_gray.shape
+    empty = {"mask": np.zeros((h, w), dtype=np.uint8), "pairs": np.empty((0, 4)), "regions": []}
+
+    kps, desc = _keypoint_detector(detector, n_features).detectAndCompute(img_gray, None)
+    if desc is None or len(kps) < 3:
+        return empty
+
+    matcher = cv2.FlannBasedMatcher(
+        dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1),
+        dict(checks=50),
+    )
+    pts = np.float32([kp.pt for kp in kps])
+
+    src, dst = [], []
+    for i, cands in enumerate(matcher.knnMatch(desc, desc, k=3)):
+        # the first neighbour of a keypoint is usually itself
+        cands = [m for m in cands if m.trainIdx != i]
+        if not cands:
+            continue
+        best = cands[0]
+        if len(cands) > 1 and best.distance >= ratio * cands[1].distance:
+            continue
+        j = best.trainIdx
+        if j < i or np.hypot(*(pts[i] - pts[j])) < min_distance:
+            continue
+        src.append(pts[i])
+        dst.append(pts[j])
+
+    if len(src) < min_region_matches:
+        return empty
+
+    src, dst = np.array(src), np.array(dst)
+    # orient every pair the same way so a single transform can explain a clone
+    flip = (dst[:, 0] < src[:, 0]) | ((dst[:, 0] == src[:, 0]) & (dst[:, 1] < src[:, 1]))
+    src[flip], dst[flip] = dst[flip].copy(), src[flip].copy()
+
+    mask = np.zeros((h, w), dtype=np.uint8)
+    regions = []
+    remaining = np.arange(len(src))
+    while len(remaining) >= min_region_matches and len(regions) < max_regions:
+        M, inliers = cv2.estimateAffinePartial2D(
+            src[remaining], dst[remaining], method=cv2.RANSAC, ransacReprojThreshold=ransac_thresh
+        )
+        if M is None:
+            break
+        inl = remaining[inliers.ravel().astype(bool)]
+        if len(inl) < min_region_matches:
+            break
+
+        for group in (src[inl], dst[inl]):
+            cv2.fillConvexPoly(mask, cv2.convexHull(group.astype(np.int32)), 255)
+        regions.append({
+            "matches": int(len(inl)),
+            "source_bbox": [int(v) for v in cv2.boundingRect(src[inl])],
+            "target_bbox": [int(v) for v in cv2.boundingRect(dst[inl])],
+            "transform": M.tolist(),
+        })
+        remaining = np.setdiff1d(remaining, inl)
+
+    pairs = np.hstack([src[:, ::-1], dst[:, ::-1]])
+    return {"mask": mask, "pairs": pairs, "regions": regions}
+
+
+COPY_MOVE_STRATEGIES = ("block", "keypoint", "both")
+
+
+def _abs_laplacian(gray):
+    # int16 is exact for uint8 input and a quarter of the float64 footprint
+    depth = cv2.CV_16S if gray.dtype == np.uint8 else cv2.CV_32F
+    return np.abs(cv2.Laplacian(gray, depth))
+
+
+def detect_edges_inconsistency(img_gray, tile_size=None):
+    """
+    Detect sharp inconsistencies (possible splicing).
+    Runs in two tiled passes: the global max of |Laplacian| first, then the
+    threshold (> 180 on the max-normalized 0-255 scale) written per tile.
+    """
+    h, w = img_gray.shape
+    thresh = np.zeros((h, w), dtype=np.uint8)
+    tiles = list(iter_tiles(h, w, tile_size, halo=1))
+
+    lap_max = 0
+    cached = None
+    for core, padded, inner in tiles:
+        lap_abs = _abs_laplacian(img_gray[padded])[inner]
+        if lap_abs.size:
+            lap_max = max(lap_max, lap_abs.max().item())
+        if len(tiles) == 1:
+            cached = lap_abs
+
+    if lap_max == 0:
+        return thresh
+
+    for core, padded, inner in tiles:
+        lap_abs = cached if cached is not None else _abs_laplacian(img_gray[padded])[inner]
+        # lap_abs / lap_max * 255 > 180, without a float normalization pass
+        thresh[core][lap_abs.astype(np.int32) * 255 > 180 * lap_max] = 255
+
     return thresh
 
 
-def detect_tampering(image_bytes: bytes):
+def tamper_mask(image_bytes, copy_move="block", tile_size=None):
     """
     Hybrid tamper detection combining:
-    - Copy-move (block hashing)
+    - Copy-move ("block" hashing, "keypoint" matching, or "both")
     - Edge inconsistency (splicing)
     Returns:
-        heatmap (PIL Image)
+        combined mask (uint8 0/255, None if unreadable)
         tamper_score (0–100)
         details (dict)
     """
     # Load image
     try:
-        img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        img_gray = to_document_image(image_bytes).gray
     except:
         return None, 0, {"error": "Cannot read image"}
 
-    arr = np.array(img)
-    img_gray = cv2.cvtColor(arr, cv2.COLOR_RGB2GRAY)
+    if copy_move not in COPY_MOVE_STRATEGIES:
+        raise ValueError(f"Unknown copy-move strategy: {copy_move}")
 
     # 1. Copy-move detection
-    copy_move_mask = block_hash(img_gray, block_size=16)
+    copy_move_mask = np.zeros(img_gray.shape, dtype=np.uint8)
+    copy_move_pairs = 0
+    regions = []
+    if copy_move in ("block", "both"):
+        blocks = find_copy_move(img_gray, block_size=16)
+        copy_move_mask = np.maximum(copy_move_mask, blocks["mask"])
+        copy_move_pairs += len(blocks["pairs"])
+    if copy_move in ("keypoint", "both"):
+        keypoints = keypoint_copy_move(img_gray)
+        copy_move_mask = np.maximum(copy_move_mask, keypoints["mask"])
+        copy_move_pairs += len(keypoints["pairs"])
+        regions = keypoints["regions"]
 
     # 2. Splicing detection
-    splice_mask = detect_edges_inconsistency(img_gray)
+    splice_mask = detect_edges_inconsistency(img_gray, tile_size=tile_size)
 
-    # Combine masks
-    combined = np.maximum(copy_move_mask, splice_mask)
+    copy_move_pixels = int(np.count_nonzero(copy_move_mask))
+    splice_pixels = int(np.count_nonzero(splice_mask))
+
+    # Combine masks (in place; both are uint8 0/255)
+    combined = np.maximum(copy_move_mask, splice_mask, out=splice_mask)
 
     # Compute tamper score
-    tamper_pixels = np.sum(combined > 0)
+    tamper_pixels = np.count_nonzero(combined)
     total_pixels = combined.size
     tamper_ratio = tamper_pixels / total_pixels
 
     tamper_score = min(100, int(tamper_ratio * 180))  # scaled
 
-    # Create heatmap
-    heatmap = generate_heatmap(combined)
-
     details = {
-        "copy_move_pixels": int(np.sum(copy_move_mask > 0)),
-        "splice_pixels": int(np.sum(splice_mask > 0)),
+        "copy_move_pixels": copy_move_pixels,
+        "copy_move_strategy": copy_move,
+        "copy_move_pairs": int(copy_move_pairs),
+        "copy_move_regions": regions,
+        "splice_pixels": splice_pixels,
         "tamper_ratio": float(tamper_ratio)
     }
 
+    return combined, tamper_score, details
+
+
+def detect_tampering(image_bytes, copy_move="block", tile_size=None, render=True):
+    """
+    Tamper detection (see tamper_mask).
+    Returns:
+        heatmap (PIL Image, None when render=False)
+        tamper_score (0–100)
+        details (dict)
+    """
+    combined, tamper_score, details = tamper_mask(image_bytes, copy_move, tile_size)
+
+    # Create heatmap
+    heatmap = None
+    if render and combined is not None:
+        heatmap = generate_heatmap(combined, tile_size=tile_size)
+
     return heatmap, tamper_score, details
@@ -0,0 +1,36 @@
+# modules/forensics/tiling.py
+import math
+from core.config import FORENSICS_TILE_BUDGET_MB
+
+# Rough working-set bytes per tile pixel for the tiled forensic passes
+# (int16 Laplacian, its absolute value, int32 comparison, uint8 outputs)
+TILE_BYTES_PER_PIXEL = 12
+
+
+def tile_size_for_budget(budget_mb=None, bytes_per_pixel=TILE_BYTES_PER_PIXEL):
+    """Square tile side whose working set fits in budget_mb megabytes."""
+    budget_mb = budget_mb or FORENSICS_TILE_BUDGET_MB
+    side = int(math.sqrt(budget_mb * 1024 * 1024 / bytes_per_pixel))
+    return max(64, side)
+
+
+def iter_tiles(height, width, tile_size=None, halo=0):
+    """
+    Yield (core, padded, inner) slice pairs covering the image.
+    core   -> tile region in image coordinates
+    padded -> core grown by `halo` pixels (clipped to the image)
+    inner  -> core expressed relative to padded
+    A tile_size of None yields a single tile covering the whole image.
+    """
+    tile_size = tile_size or max(height, width, 1)
+    for y0 in range(0, height, tile_size):
+        y1 = min(y0 + tile_size, height)
+        py0, py1 = max(0, y0 - halo), min(height, y1 + halo)
+        for x0 in range(0, width, tile_size):
+            x1 = min(x0 + tile_size, width)
+            px0, px1 = max(0, x0 - halo), min(width, x1 + halo)
+            yield (
+                (slice(y0, y1), slice(x0, x1)),
+                (slice(py0, py1), slice(px0, px1)),
+                (slice(y0 - py0, y1 - py0), slice(x0 - px0, x1 - px0)),
+            )
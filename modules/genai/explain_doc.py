@@ -1,7 +1,7 @@
 # modules/genai/explain_doc.py
 
 import os
-from modules.genai.llm_engine import run_llm
+from modules.genai.llm_engine import run_llm_cached
 
 PROMPT_PATH = os.path.join(os.path.dirname(__file__), "prompts", "doc_prompt.txt")
 
@@ -12,6 +12,21 @@ def load_prompt():
     except:
         return "You are an AI forensic expert. Explain the document authenticity."
 
+def summarize_forensics(forensic_summary):
+    """Prompt view of a forensic result: no artifact IDs, duplicate matches reduced to flags,
+    so a re-uploaded document yields the same prompt (and a cached explanation)."""
+    if not isinstance(forensic_summary, dict):
+        return forensic_summary
+    summary = {k: v for k, v in forensic_summary.items() if not k.endswith("_artifact")}
+    dup = summary.get("duplicates_report")
+    if dup:
+        summary["duplicates_report"] = {
+            "near_duplicate": dup.get("near_duplicate", False),
+            "flagged_match": dup.get("flagged_match", False),
+            "resubmitted": dup.get("resubmitted", False),
+        }
+    return summary
+
 def explain_document(ocr_text: str, forensic_summary: dict):
     base_prompt = load_prompt()
     full_prompt = (
@@ -19,7 +34,7 @@ def explain_document(ocr_text: str, forensic_summary: dict):
         + "\n\nOCR_TEXT:\n"
         + ocr_text
         + "\n\nFORENSICS:\n"
-        + str(forensic_summary)
+        + str(summarize_forensics(forensic_summary))
         + "\n\nGenerate explanation:"
     )
-    return run_llm(full_prompt)
+    return run_llm_cached(full_prompt, stage="explain_doc")
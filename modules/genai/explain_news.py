@@ -1,7 +1,7 @@
 # modules/genai/explain_news.py
 
 import os
-from modules.genai.llm_engine import run_llm
+from modules.genai.llm_engine import run_llm_cached
 
 PROMPT_PATH = os.path.join(os.path.dirname(__file__), "prompts", "news_prompt.txt")
 
@@ -25,4 +25,4 @@ def explain_news(text: str, claims, classifier_output, evidence):
         + "\n\nEVIDENCE:\n"
         + str(evidence)
     )
-    return run_llm(full_prompt)
+    return run_llm_cached(full_prompt, stage="explain_news")
@@ -2,8 +2,7 @@
 
 import requests
 import json
-
-print("DEBUG: LLM Engine Loaded -> USING OLLAMA (IPv4 + STREAMING FIX)")
+from core.cache import cached_call, sha256_hex
 
 # Always use local Ollama
 USE_OLLAMA = True
@@ -57,3 +56,14 @@ def run_llm(prompt):
     Unified LLM function — ALWAYS uses Ollama now.
     """
     return call_ollama(prompt)
+
+
+def run_llm_cached(prompt, stage="llm"):
+    """
+    run_llm with results cached by prompt SHA-256 and model name.
+    Connection/API errors are returned but never cached.
+    """
+    return cached_call(
+        stage, OLLAMA_MODEL, sha256_hex(prompt), lambda: run_llm(prompt),
+        should_cache=lambda reply: bool(reply) and not reply.startswith("[Ollama Error]"),
+    )
@@ -0,0 +1,18 @@
+# modules/news/batching.py
+"""
+In-process micro-batching for classifier inference.
+
+Concurrent predict() callers are queued on one core.batching.MicroBatcher,
+and their texts run together as one padded forward pass.
+"""
+from core.batching import MicroBatcher
+
+
+class PredictionBatcher(MicroBatcher):
+    def __init__(self, predict_fn, max_batch=16, max_wait_ms=10):
+        """predict_fn(list of texts) -> list of results, same order."""
+        super().__init__(predict_fn, max_batch, max_wait_ms, name="news-clf-batcher")
+
+    def predict(self, texts, timeout=None):
+        """Blocking: results for texts, batched with every other caller's."""
+        return self.run(texts, timeout)
@@ -1,17 +1,57 @@
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch
 import numpy as np
+from core.cache import get_cache, cache_key, sha256_hex
+from core.config import RESULT_CACHE_ENABLED, NEWS_BATCHING, NEWS_BATCH_SIZE, NEWS_BATCH_MAX_WAIT_MS
+from core.models import register_model
+from modules.news.batching import PredictionBatcher
+
+# fine-tuned weights when present, else the base checkpoint
+FINETUNED_MODEL_PATH = "models/fake_news/distilbert_news"
+BASE_MODEL_PATH = "distilbert-base-uncased"
 
 
 class NewsClassifier:
-    def __init__(self, model_path="distilbert-base-uncased", device=None):
+    def __init__(self, model_path=BASE_MODEL_PATH, device=None):
+        # torch / transformers are only imported when a classifier is built
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        self.model_path = model_path
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.tokenizer = AutoTokenizer.from_pretrained(model_path)
         self.model = AutoModelForSequenceClassification.from_pretrained(model_path)
         self.model.to(self.device)
         self.model.eval()
+        # concurrent predict() calls share padded forward passes
+        self.batcher = PredictionBatcher(self._predict, NEWS_BATCH_SIZE, NEWS_BATCH_MAX_WAIT_MS) if NEWS_BATCHING else None
+
+    def predict(self, texts, use_cache=True):
+        """
+        Per-text cached predictions; only cache misses go through the model,
+        micro-batched with other threads' requests when NEWS_BATCHING is on.
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        if not (use_cache and RESULT_CACHE_ENABLED):
+            return self._infer(texts)
+
+        cache = get_cache()
+        keys = [cache_key("news", self.model_path, sha256_hex(t)) for t in texts]
+        results = [cache.get(k) for k in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            for i, r in zip(missing, self._infer([texts[i] for i in missing])):
+                cache.put(keys[i], r, "news")
+                results[i] = r
+        return results
+
+    def _infer(self, texts):
+        if self.batcher is None:
+            return self._predict(texts)
+        return self.batcher.predict(texts)
+
+    def _predict(self, texts):
+        import torch
 
-    def predict(self, texts):
         inputs = self.tokenizer(texts, truncation=True, padding=True, return_tensors="pt")
         inputs = {k: v.to(self.device) for k, v in inputs.items()}
 
@@ -29,3 +69,13 @@ class NewsClassifier:
             })
 
         return results
+
+
+def _load_news_classifier():
+    try:
+        return NewsClassifier(FINETUNED_MODEL_PATH)
+    except Exception:
+        return NewsClassifier(BASE_MODEL_PATH)
+
+
+register_model("news_classifier", _load_news_classifier)
@@ -1,10 +1,26 @@
 import re
-import spacy
+from core.models import register_model, get_model
 
-try:
-    nlp = spacy.load("en_core_web_sm")
-except Exception:
-    nlp = None
+
+def _load_spacy():
+    import spacy
+    return spacy.load("en_core_web_sm")
+
+
+register_model("spacy", _load_spacy)
+_spacy_failed = False
+
+
+def get_nlp():
+    """spaCy pipeline, loaded on first use; None when spaCy or the model is missing."""
+    global _spacy_failed
+    if _spacy_failed:
+        return None
+    try:
+        return get_model("spacy")
+    except Exception:
+        _spacy_failed = True
+        return None
 
 URL_RE = re.compile(r'https?://\S+|www\.\S+')
 HTML_RE = re.compile(r'<.*?>')
@@ -28,6 +44,7 @@ def extract_claims(text: str, max_sentences: int = 5):
     if not text:
         return []
 
+    nlp = get_nlp()
     if nlp:
         doc = nlp(text)
         candidates = []
@@ -1,7 +1,6 @@
 import os
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from core.models import register_model
 
 BASE_DIR = os.path.dirname(__file__)
 CORPUS_DIR = os.path.join(BASE_DIR, "resources", "sample_corpus")
@@ -10,6 +9,9 @@ INDEX_PATH = os.path.join(BASE_DIR, "resources", "faiss_index.bin")
 
 class Retriever:
     def __init__(self, model_name="all-MiniLM-L6-v2"):
+        # heavy imports deferred until a retriever is actually built
+        from sentence_transformers import SentenceTransformer
+
         self.model = SentenceTransformer(model_name)
         self.index = None
         self.documents = []
@@ -34,6 +36,8 @@ class Retriever:
         embeddings = self.model.encode(docs, convert_to_numpy=True)
         embeddings = embeddings.astype("float32")
 
+        import faiss
+
         dim = embeddings.shape[1]
         index = faiss.IndexFlatL2(dim)
         index.add(embeddings)
@@ -56,3 +60,6 @@ class Retriever:
             })
 
         return results
+
+
+register_model("retriever", Retriever)
@@ -0,0 +1,65 @@
+# modules/ocr/batching.py
+"""
+Cross-document dynamic batching for text-line recognition.
+
+Detection still runs per page, but the text-line crops it produces are
+queued here from every page and every concurrent request on a
+core.batching.MicroBatcher. A batch is flushed when it reaches max_batch
+crops or when its oldest crop has waited max_wait_ms. Crops are grouped
+by aspect-ratio bucket so a batch pads to similar widths, and results
+are scattered back to the waiting callers.
+"""
+import math
+
+import cv2
+import numpy as np
+
+from core.batching import MicroBatcher
+
+
+def crop_text_region(img, box):
+    """Perspective-crop a 4-point text box; tall crops are rotated upright (as PaddleOCR does)."""
+    pts = np.asarray(box, dtype=np.float32).reshape(4, 2)
+    w = int(max(np.linalg.norm(pts[0] - pts[1]), np.linalg.norm(pts[2] - pts[3])))
+    h = int(max(np.linalg.norm(pts[0] - pts[3]), np.linalg.norm(pts[1] - pts[2])))
+    w, h = max(w, 1), max(h, 1)
+    dst = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+    crop = cv2.warpPerspective(img, cv2.getPerspectiveTransform(pts, dst), (w, h),
+                               borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if h / w >= 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def reading_order(boxes, line_tol=10):
+    """Indices of boxes in reading order: top-to-bottom, then left-to-right within a line."""
+    idx = sorted(range(len(boxes)), key=lambda k: (boxes[k][0][1], boxes[k][0][0]))
+    for i in range(len(idx) - 1):
+        j = i
+        while j >= 0:
+            a, b = boxes[idx[j]][0], boxes[idx[j + 1]][0]
+            if not (abs(b[1] - a[1]) < line_tol and b[0] < a[0]):
+                break
+            idx[j], idx[j + 1] = idx[j + 1], idx[j]
+            j -= 1
+    return idx
+
+
+def sort_boxes(boxes, line_tol=10):
+    return [boxes[k] for k in reading_order(boxes, line_tol)]
+
+
+def width_bucket(crop):
+    # recognizer input is height-normalized, so padding cost tracks w / h
+    h, w = crop.shape[:2]
+    return max(0, math.ceil(math.log2(max(w / max(h, 1), 1.0))))
+
+
+class RecognitionBatcher(MicroBatcher):
+    def __init__(self, recognize_fn, max_batch=32, max_wait_ms=15):
+        """recognize_fn(list of crops) -> list of (text, confidence), same order."""
+        super().__init__(recognize_fn, max_batch, max_wait_ms, name="ocr-rec-batcher", group_key=width_bucket)
+
+    def recognize(self, crops, timeout=None):
+        """Queue crops with everyone else's and block until this caller's results are back."""
+        return self.run(crops, timeout)
@@ -0,0 +1,151 @@
+# modules/ocr/bench_scripts/bench_preprocess.py
+"""
+Benchmark OCR preprocessing strategies on sample documents.
+
+Run from project root:
+    python modules/ocr/bench_scripts/bench_preprocess.py [--samples DIR] [--ocr]
+
+Without --samples, synthetic pages with known text are generated in five
+variants: clean, lightly noisy, noisy, skewed, and noisy plus skewed.
+Sample images may have a sidecar .txt with their ground-truth text. --ocr
+also runs an OCR engine on each preprocessed page and reports character
+accuracy: PaddleOCR (the production engine) by default, or with
+--engine rapidocr the same PP-OCR models as ONNX (rapidocr-onnxruntime),
+for machines that cannot download the Paddle weights.
+"""
+import argparse
+import difflib
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from PIL import Image  # noqa: E402
+from modules.ocr.preprocess import preprocess_pipeline  # noqa: E402
+
+# name -> preprocess_pipeline kwargs; "legacy" is the default bilateral / no-deskew path
+STRATEGIES = {
+    "legacy": {"denoise_strategy": "bilateral", "deskew_pages": False},
+    "auto": {"denoise_strategy": "auto", "deskew_pages": False},
+    "auto+deskew": {"denoise_strategy": "auto", "deskew_pages": True},
+    "median": {"denoise_strategy": "median", "deskew_pages": True},
+    "gaussian": {"denoise_strategy": "gaussian", "deskew_pages": True},
+    "none": {"denoise_strategy": "none", "deskew_pages": True},
+}
+
+WORDS = ("invoice total amount salary employee account payment date number "
+         "tax net gross bank transfer reference period balance due").split()
+
+
+def synthetic_pages(n=3, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        page = np.full((2200, 1700), 245, np.uint8)
+        lines = []
+        for y in range(150, 2050, 60):
+            line = " ".join(rng.choice(WORDS, 5)) + f" {rng.integers(100, 99999)}"
+            cv2.putText(page, line, (100, y), cv2.FONT_HERSHEY_SIMPLEX, 1.4, 20, 3)
+            lines.append(line)
+        truth = "\n".join(lines)
+        light = np.clip(page + rng.normal(0, 5, page.shape), 0, 255).astype(np.uint8)
+        noisy = np.clip(page + rng.normal(0, 12, page.shape), 0, 255).astype(np.uint8)
+        m = cv2.getRotationMatrix2D((850, 1100), 2.5, 1.0)
+        skewed = cv2.warpAffine(page, m, (1700, 2200), borderValue=245)
+        both = cv2.warpAffine(noisy, m, (1700, 2200), borderValue=245)
+        for variant, img in (("clean", page), ("light-noise", light), ("noisy", noisy), ("skewed", skewed),
+                             ("noisy+skewed", both)):
+            yield f"synthetic{i}-{variant}", img, truth
+
+
+def sample_pages(folder):
+    for name in sorted(os.listdir(folder)):
+        if not name.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp")):
+            continue
+        img = np.asarray(Image.open(os.path.join(folder, name)).convert("L"))
+        txt = os.path.splitext(os.path.join(folder, name))[0] + ".txt"
+        truth = open(txt, encoding="utf-8").read() if os.path.exists(txt) else None
+        yield name, img, truth
+
+
+def load_engine(name):
+    """fn(preprocessed uint8 page) -> recognized text in reading order."""
+    if name == "rapidocr":
+        from rapidocr_onnxruntime import RapidOCR
+        engine = RapidOCR()
+
+        def run(img):
+            res, _ = engine(np.ascontiguousarray(img))
+            res = sorted(res or [], key=lambda r: (round(r[0][0][1] / 30), r[0][0][0]))
+            return " ".join(r[1] for r in res)
+        return run
+
+    import modules.ocr.ocr_service  # noqa: F401  registers the "ocr" engine
+    from core.models import get_model
+    engine = get_model("ocr")
+
+    def run(img):
+        res = engine.ocr(img, cls=True)
+        return " ".join(t for block in (res or []) if block for _, (t, _) in block)
+    return run
+
+
+def char_accuracy(text, truth):
+    norm = lambda s: " ".join(s.lower().split())
+    return difflib.SequenceMatcher(None, norm(text), norm(truth)).ratio()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--samples", help="folder of images (optional sidecar .txt ground truth)")
+    ap.add_argument("--ocr", action="store_true", help="also OCR each output and score accuracy")
+    ap.add_argument("--engine", choices=("paddle", "rapidocr"), default="paddle", help="OCR engine for --ocr")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    engine = load_engine(args.engine) if args.ocr else None
+
+    pages = list(sample_pages(args.samples) if args.samples else synthetic_pages())
+    totals = {name: {"ms": [], "acc": [], "variants": {}, "steps": {}} for name in STRATEGIES}
+
+    for page_name, gray, truth in pages:
+        pil = Image.fromarray(gray).convert("RGB")
+        for name, kwargs in STRATEGIES.items():
+            best, report, out = None, None, None
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                out, report = preprocess_pipeline(pil, **kwargs)
+                ms = (time.perf_counter() - t0) * 1000
+                best = ms if best is None else min(best, ms)
+            totals[name]["ms"].append(best)
+            for step, v in report["timings_ms"].items():
+                totals[name]["steps"].setdefault(step, []).append(v)
+            line = (f"{page_name:24s} {name:11s} {best:8.1f} ms  denoise={report['denoise']} "
+                    f"c={report['threshold_c']} skew={report['skew_angle']}")
+            if engine is not None and truth:
+                acc = char_accuracy(engine(out), truth)
+                totals[name]["acc"].append(acc)
+                # synthetic pages are named "syntheticN-<variant>"
+                variant = page_name.split("-", 1)[1] if page_name.startswith("synthetic") else "samples"
+                totals[name]["variants"].setdefault(variant, []).append(acc)
+                line += f"  acc={acc:.3f}"
+            print(line)
+
+    print("\nstrategy     mean ms   " + ("mean acc  " if engine else "") + "per-step mean ms")
+    for name, t in totals.items():
+        steps = ", ".join(f"{k}={np.mean(v):.1f}" for k, v in t["steps"].items())
+        acc = f"{np.mean(t['acc']):8.3f}  " if t["acc"] else ""
+        print(f"{name:11s} {np.mean(t['ms']):8.1f}   {acc}{steps}")
+    if engine is not None:
+        print("\nmean acc per variant")
+        for name, t in totals.items():
+            print(f"{name:11s} " + ", ".join(f"{v}={np.mean(a):.3f}" for v, a in t["variants"].items()))
+
+
+if __name__ == "__main__":
+    main()
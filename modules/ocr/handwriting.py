@@ -1,27 +1,105 @@
 # modules/ocr/handwriting.py
-from paddleocr import PaddleOCR
-import tempfile
-from core.utils import bytes_to_pil
-
-htr_engine = PaddleOCR(
-    det_model_dir=None,  # use recognition only
-    rec_model_dir="ch_ppocr_mobile_v2.0_rec",  # handwriting-capable model
-    use_gpu=False,
-    lang="en",
-    show_log=False
-)
+import logging
+import threading
+from core.utils import to_document_image
+from core.config import HANDWRITING_LAYOUT_LABELS, HANDWRITING_FULL_PAGE_FALLBACK
+from core.models import register_model, get_model
+
+
+def _load_htr_engine():
+    from paddleocr import PaddleOCR
+    return PaddleOCR(
+        det_model_dir=None,  # use recognition only
+        rec_model_dir="ch_ppocr_mobile_v2.0_rec",  # handwriting-capable model
+        use_gpu=False,
+        lang="en",
+        show_log=False
+    )
 
-def handwriting_ocr(file_bytes):
-    pil_img = bytes_to_pil(file_bytes)
 
-    with tempfile.NamedTemporaryFile(suffix=".png") as tmp:
-        pil_img.save(tmp.name)
-        result = htr_engine.ocr(tmp.name)
+register_model("handwriting", _load_htr_engine)
+# Paddle predictors are not thread-safe; PDF page workers share this engine
+htr_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+_warned_no_regions = False
+
+def handwriting_ocr(file_bytes):
+    # bytes or DocumentImage; the engine takes the shared BGR view directly
+    img = to_document_image(file_bytes).bgr
+    with htr_lock:
+        result = get_model("handwriting").ocr(img)
 
     text = ""
     if result:
         for line in result:
+            if not line:
+                continue
             for box, (txt, conf) in line:
                 text += txt + " "
 
     return text.strip()
+
+
+def recognize_crops(crops):
+    """Recognize pre-cropped BGR regions in one recognizer batch -> [(text, confidence)]."""
+    if not crops:
+        return []
+    htr_engine = get_model("handwriting")
+    with htr_lock:
+        recognizer = getattr(htr_engine, "text_recognizer", None)
+        if recognizer is not None:
+            rec_res, _ = recognizer(crops)
+            return [(txt, float(conf)) for txt, conf in rec_res]
+        # engines without a batch recognizer: one det-free call per crop
+        out = []
+        for crop in crops:
+            res = htr_engine.ocr(crop, det=False, cls=False)
+            txt, conf = res[0][0] if res and res[0] else ("", 0.0)
+            out.append((txt, float(conf)))
+        return out
+
+
+def handwriting_from_layout(file_bytes, regions, labels=HANDWRITING_LAYOUT_LABELS, pad=4,
+                            full_page_fallback=HANDWRITING_FULL_PAGE_FALLBACK):
+    """
+    Handwriting routed by layout: crop only regions whose label is in
+    `labels` (handwriting / signature classes), recognize them in one
+    batch and return {"text", "regions": [{"label", "bbox", "text",
+    "confidence"}], "source"} in reading order. When no region carries
+    one of those labels (always the case with the stock PP-StructureV3
+    layout models) the whole page is read as before, "source": "full_page".
+    """
+    global _warned_no_regions
+    img = to_document_image(file_bytes).bgr
+    h, w = img.shape[:2]
+    picked, crops = [], []
+    for r in sorted(regions, key=lambda r: (r["bbox"][1], r["bbox"][0])):
+        if r["label"] not in labels:
+            continue
+        x1, y1, x2, y2 = r["bbox"]
+        x1, y1 = max(0, x1 - pad), max(0, y1 - pad)
+        x2, y2 = min(w, x2 + pad), min(h, y2 + pad)
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            continue
+        picked.append({"label": r["label"], "bbox": [x1, y1, x2, y2]})
+        crops.append(img[y1:y2, x1:x2])
+
+    if not picked and full_page_fallback:
+        if not _warned_no_regions:
+            _warned_no_regions = True
+            found = sorted({r["label"] for r in regions})
+            logger.warning("No layout region labelled %s (layout labels: %s); reading handwriting from the "
+                           "full page. Set HANDWRITING_LAYOUT_LABELS for a handwriting-aware layout model.",
+                           sorted(labels), found)
+        text = handwriting_ocr(file_bytes)
+        return {"text": text, "regions": [{"label": "page", "bbox": [0, 0, w, h], "text": text, "confidence": None}],
+                "source": "full_page"}
+
+    for region, (txt, conf) in zip(picked, recognize_crops(crops)):
+        region["text"] = txt
+        region["confidence"] = conf
+    return {
+        "text": " ".join(r["text"] for r in picked if r.get("text")).strip(),
+        "regions": picked,
+        "source": "layout",
+    }
@@ -1,46 +1,221 @@
 # modules/ocr/idcard_extractor.py
+"""
+Template-driven field extraction for ID cards, payslips and bank statements.
+
+Each template is a list of field specs: the label spellings that introduce
+the field and a precompiled pattern for its value. A document is a list of
+text lines (plain text, or an OCRPage with line boxes). Label lines are
+found by fuzzy-matching the head of every line (text before ":", or its
+first 1-3 words) against all labels, for a whole batch of documents in one
+vectorized rapidfuzz process.cdist call. The value is read from the rest
+of the label line, else from the line to its right or just below it (OCR
+geometry), else from the next line; a few fields fall back to a pattern
+search over the whole text when no label is found.
+"""
 import re
-from rapidfuzz import fuzz
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# minimum fuzz.ratio (0-100) between a line head and a label
+LABEL_MIN_SCORE = 85
+# line heads tried when a line has no ":" (label may be 1-3 words long)
+MAX_LABEL_WORDS = 3
+
+_DATE = r"\d{1,2}[/\-. ]\d{1,2}[/\-. ]\d{2,4}|\d{4}[/\-.]\d{1,2}[/\-.]\d{1,2}|\d{1,2} [A-Za-z]{3,9}\.? \d{4}"
+_MONEY = r"[-+]?[$€£₹]?\s?\d{1,3}(?:[, ]\d{3})*(?:\.\d{1,2})?(?!\d)|[-+]?[$€£₹]?\s?\d+(?:\.\d{1,2})?"
+_NAME = r"[A-Za-z][A-Za-z.'\-]*(?: [A-Za-z][A-Za-z.'\-]*){0,4}"
+
+
+def _gender(v):
+    v = v.lower()
+    return "Female" if v.startswith("f") else "Male"
+
+
+def _digits_only(v):
+    return re.sub(r"[\s\-]", "", v)
+
+
+def _money(v):
+    return v.replace(" ", "")
+
+
+# labels: lowercase spellings; value: pattern searched in the candidate text
+# (group "v" if present); fallback: also search the whole text when no label matches
+TEMPLATES = {
+    "id_card": [
+        {"field": "name", "labels": ["name", "full name", "given name", "holder name"], "value": _NAME},
+        {"field": "dob", "labels": ["dob", "date of birth", "birth date", "born"],
+         "value": _DATE, "fallback": True},
+        {"field": "id_number",
+         "labels": ["id no", "id number", "id", "card no", "card number", "document no",
+                    "document number", "passport no", "licence no", "license no", "no"],
+         # at least one digit, so plain words in capitals are not IDs
+         "value": r"\b\d{4} \d{4} \d{4}\b|\b(?=[A-Z]*\d)[A-Z0-9][A-Z0-9\-]{5,17}[A-Z0-9]\b",
+         "fallback": True, "normalize": _digits_only},
+        {"field": "gender", "labels": ["sex", "gender"], "value": r"(?i)\b(?P<v>female|male|f|m)\b",
+         "fallback_value": r"(?i)\b(?P<v>female|male)\b", "fallback": True, "normalize": _gender},
+    ],
+    "payslip": [
+        {"field": "employee_name", "labels": ["employee name", "employee", "name"], "value": _NAME},
+        {"field": "employee_id", "labels": ["employee id", "employee no", "emp id", "emp no", "staff no"],
+         "value": r"\b[A-Z0-9][A-Z0-9\-/]{1,19}\b"},
+        {"field": "employer", "labels": ["employer", "company", "company name"], "value": r"\S.{1,80}"},
+        {"field": "pay_period", "labels": ["pay period", "period", "month"],
+         "value": rf"(?:{_DATE})(?:\s*(?:-|to)\s*(?:{_DATE}))?|[A-Za-z]{{3,9}}\.? \d{{4}}"},
+        {"field": "pay_date", "labels": ["pay date", "payment date", "date paid"], "value": _DATE},
+        {"field": "gross_pay", "labels": ["gross pay", "gross salary", "gross earnings", "total earnings", "gross"],
+         "value": _MONEY, "normalize": _money},
+        {"field": "deductions", "labels": ["total deductions", "deductions"], "value": _MONEY, "normalize": _money},
+        {"field": "net_pay", "labels": ["net pay", "net salary", "take home", "net amount", "net"],
+         "value": _MONEY, "normalize": _money},
+    ],
+    "bank_statement": [
+        {"field": "account_holder", "labels": ["account holder", "account name", "name", "customer name"],
+         "value": _NAME},
+        {"field": "account_number", "labels": ["account number", "account no", "a/c no", "acct no"],
+         "value": r"\b[Xx*\d][Xx*\d \-]{4,20}\d\b", "normalize": _digits_only},
+        {"field": "iban", "labels": ["iban"], "value": r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,3})?\b",
+         "fallback": True, "normalize": _digits_only},
+        {"field": "sort_code", "labels": ["sort code", "ifsc", "routing number", "bic", "swift"],
+         "value": r"\b\d{2}-\d{2}-\d{2}\b|\b[A-Z]{4}0[A-Z0-9]{6}\b|\b\d{9}\b|\b[A-Z]{6}[A-Z0-9]{2}(?:[A-Z0-9]{3})?\b"},
+        {"field": "statement_period", "labels": ["statement period", "period", "statement date"],
+         "value": rf"(?:{_DATE})(?:\s*(?:-|to)\s*(?:{_DATE}))?"},
+        {"field": "opening_balance", "labels": ["opening balance", "balance brought forward", "previous balance"],
+         "value": _MONEY, "normalize": _money},
+        {"field": "closing_balance", "labels": ["closing balance", "balance carried forward", "available balance"],
+         "value": _MONEY, "normalize": _money},
+    ],
+}
+
+
+def _compile(template):
+    """Precompile value patterns and flatten labels -> (label list, field index per label)."""
+    fields, labels, owner = [], [], []
+    for i, spec in enumerate(template):
+        spec = dict(spec)
+        spec["value"] = re.compile(spec["value"])
+        spec["fallback_value"] = re.compile(spec["fallback_value"]) if "fallback_value" in spec else spec["value"]
+        fields.append(spec)
+        for label in spec["labels"]:
+            labels.append(label)
+            owner.append(i)
+    return {"fields": fields, "labels": labels, "owner": np.asarray(owner)}
+
+
+_COMPILED = {name: _compile(t) for name, t in TEMPLATES.items()}
+TEMPLATE_NAMES = tuple(TEMPLATES)
+
 
-def extract_fields(text):
+def _doc_lines(doc):
+    """(texts, (N, 4) boxes or None) in reading order, for text or an OCRPage."""
+    if isinstance(doc, str):
+        return [l.strip() for l in doc.splitlines() if l.strip()], None
+    order = doc.order
+    return [doc.line_text(i).strip() for i in order], doc.bboxes()[order]
+
+
+def _heads(line):
+    """[(head, rest)] candidate label / value splits of one line."""
+    if ":" in line:
+        head, rest = line.split(":", 1)
+        return [(head.strip().lower(), rest.strip())]
+    words = line.split()
+    return [(" ".join(words[:k]).lower(), " ".join(words[k:]))
+            for k in range(1, min(MAX_LABEL_WORDS, len(words)) + 1)]
+
+
+def _match(pattern, text):
+    m = pattern.search(text)
+    if not m:
+        return None
+    v = m.group("v") if "v" in pattern.groupindex else m.group(0)
+    return v.strip() or None
+
+
+def _neighbours(i, boxes, n):
+    """Line indices that may hold the value of label line i: right of it, then below it."""
+    if boxes is None:
+        return [i + 1] if i + 1 < n else []
+    x1, y1, x2, y2 = boxes[i]
+    h = max(y2 - y1, 1.0)
+    bx1, by1, bx2, by2 = boxes.T
+    overlap_y = np.minimum(y2, by2) - np.maximum(y1, by1)
+    right = np.nonzero((overlap_y > 0.5 * h) & (bx1 >= x2 - 0.5 * h))[0]
+    right = right[np.argsort(bx1[right] - x2)]
+    overlap_x = np.minimum(x2, bx2) - np.maximum(x1, bx1)
+    below = np.nonzero((by1 >= y2 - 0.5 * h) & (by1 - y2 < 3 * h) & (overlap_x > 0))[0]
+    below = below[np.argsort(by1[below] - y2)]
+    return [int(j) for j in np.concatenate([right, below]) if j != i]
+
+
+def extract_fields_batch(docs, template="id_card", min_score=LABEL_MIN_SCORE):
     """
-    Extracts common ID fields: Name, DOB, ID number, Gender.
-    Uses regex + fuzzy search.
+    Extract template fields from many documents at once. docs are strings
+    or OCRPage objects; returns one {field: value or None} dict per doc.
     """
+    if template not in _COMPILED:
+        raise ValueError(f"Unknown template {template!r}; expected one of {TEMPLATE_NAMES}")
+    tpl = _COMPILED[template]
+    fields = tpl["fields"]
 
-    fields = {
-        "name": None,
-        "dob": None,
-        "id_number": None,
-        "gender": None
-    }
-
-    # DOB
-    dob_patterns = [
-        r"\b\d{2}[\/\-]\d{2}[\/\-]\d{4}\b",
-        r"\b\d{4}[\/\-]\d{2}[\/\-]\d{2}\b"
-    ]
-    for p in dob_patterns:
-        match = re.search(p, text)
-        if match:
-            fields["dob"] = match.group(0)
-            break
-
-    # Gender
-    if "male" in text.lower():
-        fields["gender"] = "Male"
-    elif "female" in text.lower():
-        fields["gender"] = "Female"
-
-    # ID Number (12–16 digits)
-    id_match = re.search(r"\b[A-Z0-9]{10,18}\b", text)
-    if id_match:
-        fields["id_number"] = id_match.group(0)
-
-    # Name extraction using fuzzy logic
-    lines = text.split("\n")
-    for line in lines:
-        if fuzz.partial_ratio("name", line.lower()) > 70:
-            fields["name"] = line.replace("Name", "").replace(":", "").strip()
-
-    return fields
+    # every candidate head of every line of every document, in one list
+    docs_lines, heads, rests, head_line, head_doc = [], [], [], [], []
+    for d, doc in enumerate(docs):
+        lines, boxes = _doc_lines(doc)
+        docs_lines.append((lines, boxes))
+        for li, line in enumerate(lines):
+            for head, rest in _heads(line):
+                heads.append(head)
+                rests.append(rest)
+                head_line.append(li)
+                head_doc.append(d)
+
+    results = [{spec["field"]: None for spec in fields} for _ in docs]
+    if heads:
+        # (labels x heads) similarity for the whole batch, multi-threaded in C++
+        scores = process.cdist(tpl["labels"], heads, scorer=fuzz.ratio, dtype=np.uint8,
+                               score_cutoff=min_score, workers=-1)
+        # best label per field: (fields x heads)
+        field_scores = np.zeros((len(fields), len(heads)), dtype=np.uint8)
+        np.maximum.at(field_scores, tpl["owner"], scores)
+        head_doc = np.asarray(head_doc)
+        starts = np.searchsorted(head_doc, np.arange(len(docs) + 1))
+
+        for d in range(len(docs)):
+            lo, hi = starts[d], starts[d + 1]
+            if lo == hi:
+                continue
+            lines, boxes = docs_lines[d]
+            block = field_scores[:, lo:hi]
+            for f, spec in enumerate(fields):
+                hits = np.nonzero(block[f])[0]
+                # strongest label first, then earliest in reading order
+                for h in hits[np.lexsort((hits, -block[f, hits].astype(np.int16)))]:
+                    h = lo + h
+                    value = _match(spec["value"], rests[h])
+                    if value is None:
+                        for j in _neighbours(head_line[h], boxes, len(lines)):
+                            value = _match(spec["value"], lines[j])
+                            if value is not None:
+                                break
+                    if value is not None:
+                        results[d][spec["field"]] = spec["normalize"](value) if "normalize" in spec else value
+                        break
+
+    for (lines, _), out in zip(docs_lines, results):
+        text = None
+        for spec in fields:
+            if out[spec["field"]] is None and spec.get("fallback"):
+                text = "\n".join(lines) if text is None else text
+                value = _match(spec["fallback_value"], text)
+                if value is not None:
+                    out[spec["field"]] = spec["normalize"](value) if "normalize" in spec else value
+    return results
+
+
+def extract_fields(doc, template="id_card"):
+    """
+    Fields of one document (text or OCRPage). The default "id_card"
+    template returns name, dob, id_number and gender.
+    """
+    return extract_fields_batch([doc], template)[0]
@@ -1,36 +1,85 @@
-import io
-import cv2
-import numpy as np
-from PIL import Image
+import threading
+from core.utils import to_document_image
+from core.models import register_model, get_model
 
-# NEW paddleocr imports for PPStructureV3
-from paddleocr import PPStructureV3
 
-# NEW location of draw function (works for PaddleOCR 2.7+)
-try:
-    from paddleocr.ppstructure.utility import draw_structure_result
-except:
-    # fallback for other versions
-    from paddleocr.ppstructure.recovery.recovery_to_doc import convert_info_docx as draw_structure_result
+def _load_layout_engine():
+    # NEW paddleocr imports for PPStructureV3 (imported on first use)
+    from paddleocr import PPStructureV3
 
+    # NEW location of draw function (works for PaddleOCR 2.7+)
+    try:
+        from paddleocr.ppstructure.utility import draw_structure_result
+    except:
+        # fallback for other versions
+        from paddleocr.ppstructure.recovery.recovery_to_doc import convert_info_docx as draw_structure_result
+
+    # the advanced layout + OCR engine, and its drawing helper
+    return PPStructureV3(show_log=False), draw_structure_result
+
+
+register_model("layout", _load_layout_engine)
+# one call at a time per engine; PDF page workers share it
+engine_lock = threading.Lock()
 
-# Initialize the advanced layout + OCR engine
-engine = PPStructureV3(show_log=False)
 
+def analyze_layout(file_bytes, visualize=False):
+    """
+    Run the layout engine -> (raw result, visualization or None). The
+    visualization is an ndarray and only drawn when visualize=True; use
+    layout_regions() for a JSON-safe summary of the result.
+    """
+    # Shared BGR view (bytes or DocumentImage)
+    img_np = to_document_image(file_bytes).bgr
 
-def analyze_layout(file_bytes):
-    # Convert bytes → PIL → OpenCV
-    img = Image.open(io.BytesIO(file_bytes)).convert("RGB")
-    img_np = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+    engine, draw_structure_result = get_model("layout")
 
     # Run the full layout engine
-    result = engine(img_np)
+    with engine_lock:
+        result = engine(img_np)
 
     # Try to draw visual layout output
     vis = None
-    try:
-        vis = draw_structure_result(img_np, result)
-    except Exception:
-        pass  # safe fallback
+    if visualize:
+        try:
+            vis = draw_structure_result(img_np, result)
+        except Exception:
+            pass  # safe fallback
 
     return result, vis
+
+
+def layout_regions(result):
+    """
+    Flatten a layout result into [{"label", "bbox": [x1, y1, x2, y2], "score"}].
+    Handles the PPStructure list-of-regions format ("type" / "bbox") and
+    the PP-StructureV3 format ("layout_det_res" -> "boxes" with "label" /
+    "coordinate").
+    """
+    if isinstance(result, tuple):  # analyze_layout() returns (result, vis)
+        result = result[0]
+    if result is None:
+        return []
+    if not isinstance(result, list):
+        result = [result]
+
+    regions = []
+    for item in result:
+        try:
+            det = item["layout_det_res"] if "layout_det_res" in item else None
+        except Exception:
+            det = None
+        if det is not None:
+            for box in det["boxes"]:
+                regions.append({
+                    "label": str(box["label"]).lower(),
+                    "bbox": [int(v) for v in box["coordinate"]],
+                    "score": float(box.get("score", 1.0)),
+                })
+        elif isinstance(item, dict) and "bbox" in item:
+            regions.append({
+                "label": str(item.get("type", "")).lower(),
+                "bbox": [int(v) for v in item["bbox"]],
+                "score": float(item.get("score", 1.0)),
+            })
+    return regions
@@ -1,79 +1,392 @@
 # modules/ocr/ocr_service.py
 
-from paddleocr import PaddleOCR
-from modules.ocr.preprocess import preprocess_pil_image
-from modules.ocr.layout import analyze_layout
-from modules.ocr.handwriting import handwriting_ocr
-from modules.ocr.idcard_extractor import extract_fields
-from core.utils import bytes_to_pil
-from pdf2image import convert_from_bytes
+from modules.ocr.preprocess import preprocess_pipeline, to_source_coords
+from modules.ocr.layout import analyze_layout, layout_regions
+from modules.ocr.handwriting import handwriting_from_layout
+from modules.ocr.idcard_extractor import extract_fields, extract_fields_batch
+from modules.ocr.pdf_text import extract_text_layer
+from modules.ocr.batching import RecognitionBatcher, crop_text_region, reading_order
+from modules.ocr.result import OCRPage
+from core.utils import to_document_image, DocumentImage, frame_count, iter_frames, iter_bounded
+from core.cache import cached_call, sha256_hex
+from core.models import register_model, get_model
+from core.config import (
+    OCR_PDF_DPI, OCR_PDF_WORKERS, OCR_DEFAULT_PROFILE,
+    OCR_BATCHING, OCR_REC_BATCH_SIZE, OCR_BATCH_MAX_WAIT_MS, OCR_DESKEW, OCR_DENOISE,
+)
+from pdf2image import convert_from_path, pdfinfo_from_path
+import os
 import tempfile
+import threading
+import cv2
+import numpy as np
 
 
-# Main OCR engine
-ocr_engine = PaddleOCR(
-    use_angle_cls=True,
-    lang='en',
-    use_gpu=False,
-    show_log=False
-)
+# bump when the engine, its settings or the post-processing change
+OCR_VERSION = "paddleocr-en-12"
+
+def _load_ocr_engine():
+    # Main OCR engine; paddleocr itself is only imported on first use
+    from paddleocr import PaddleOCR
+    return PaddleOCR(
+        use_angle_cls=True,
+        lang='en',
+        use_gpu=False,
+        show_log=False,
+        # large enough for the cross-document batches built in batching.py
+        rec_batch_num=OCR_REC_BATCH_SIZE
+    )
+
+
+register_model("ocr", _load_ocr_engine)
+# Paddle predictors are not thread-safe; PDF page workers share this engine
+ocr_lock = threading.Lock()
+# same cut-off PaddleOCR applies to recognized lines
+DROP_SCORE = 0.5
+
+
+def _recognize_crops(crops):
+    engine = get_model("ocr")
+    with ocr_lock:
+        rec_res, _ = engine.text_recognizer(crops)
+    return rec_res
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_batcher():
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = RecognitionBatcher(_recognize_crops, OCR_REC_BATCH_SIZE, OCR_BATCH_MAX_WAIT_MS)
+        return _batcher
+
 
+def _ocr_lines(img, cls):
+    """
+    Text lines of one page as (boxes, scores, texts, order), lines with a
+    score below DROP_SCORE removed. With OCR_BATCHING, detection (and the
+    angle classifier) run here per page and the text-line crops join the
+    shared recognition batcher; otherwise the engine's own one-page
+    pipeline is used.
+    """
+    engine = get_model("ocr")
+    if not OCR_BATCHING or not hasattr(engine, "text_recognizer"):
+        with ocr_lock:
+            result = engine.ocr(img, cls=cls)
+        # PaddleOCR returns [None] for a page without text
+        block = result[0] if result and result[0] else []
+        boxes = [np.asarray(box, dtype=np.float32) for box, _ in block]
+        scores = [float(conf) for _, (_, conf) in block]
+        texts = [txt for _, (txt, _) in block]
+        return boxes, scores, texts, reading_order(boxes)
 
-def ocr_image_bytes(file_bytes: bytes) -> dict:
-    """Full enhanced OCR for images."""
-    pil_img = preprocess_pil_image(bytes_to_pil(file_bytes))
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    with ocr_lock:
+        det = engine.ocr(img, rec=False, cls=False)
+    boxes = [np.asarray(b, dtype=np.float32) for b in (det[0] if det and det[0] else [])]
+    crops = [crop_text_region(img, box) for box in boxes]
+    if cls and crops:
+        with ocr_lock:
+            crops, _, _ = engine.text_classifier(crops)
+    keep = [(box, float(conf), txt) for box, (txt, conf) in zip(boxes, get_batcher().recognize(crops))
+            if conf >= DROP_SCORE]
+    boxes = [k[0] for k in keep]
+    return boxes, [k[1] for k in keep], [k[2] for k in keep], reading_order(boxes)
 
-    with tempfile.NamedTemporaryFile(suffix=".png") as tmp:
-        pil_img.save(tmp.name)
-        result = ocr_engine.ocr(tmp.name, cls=True)
 
-    text = " ".join([txt for block in result for box, (txt, conf) in block])
+def ocr_page(img, cls, page=1, size=None, prep=None) -> OCRPage:
+    """
+    Columnar OCR result for one page. prep is the preprocess_pipeline
+    report when img was preprocessed: boxes are then mapped back to the
+    source image's pixels. size is the (width, height) of that image.
+    """
+    boxes, scores, texts, order = _ocr_lines(img, cls)
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4, 2)
+    if prep is not None:
+        boxes = to_source_coords(boxes, prep)
+    width, height = size or (img.shape[1], img.shape[0])
+    return OCRPage(boxes, scores, texts, order, page=page, width=width, height=height)
 
-    layout = analyze_layout(file_bytes)
-    handwriting = handwriting_ocr(file_bytes)
-    id_fields = extract_fields(text)
 
+# Which engines run, and at what resolution
+#   fast:     text recognition only, no angle classifier / deskew, lower resolution
+#   standard: + angle classifier, deskew, denoise + binarization and layout
+#   full:     + handwriting and ID fields
+OCR_PROFILES = {
+    "fast": {"cls": False, "resize_max": 1280, "binarize": False, "deskew": False, "pdf_dpi": 120,
+             "layout": False, "handwriting": False, "id_fields": False},
+    "standard": {"cls": True, "resize_max": 2000, "binarize": True, "deskew": True, "pdf_dpi": OCR_PDF_DPI,
+                 "layout": True, "handwriting": False, "id_fields": False},
+    "full": {"cls": True, "resize_max": 2000, "binarize": True, "deskew": True, "pdf_dpi": OCR_PDF_DPI,
+             "layout": True, "handwriting": True, "id_fields": True},
+}
+PROFILE_NAMES = tuple(OCR_PROFILES) + ("auto",)
+
+
+def preprocess_settings(profile) -> dict:
+    """Effective preprocessing settings for a profile; "auto" may pick any of them."""
+    names = [profile] if profile in OCR_PROFILES else sorted(OCR_PROFILES)
     return {
-        "text": text.strip(),
-        "layout": layout,
-        "handwriting": handwriting,
-        "id_fields": id_fields
+        "denoise": OCR_DENOISE,
+        "deskew": OCR_DESKEW,
+        "profiles": {n: {k: OCR_PROFILES[n][k] for k in ("resize_max", "binarize", "deskew", "pdf_dpi")}
+                     for n in names},
     }
 
 
-def ocr_pdf_bytes(file_bytes: bytes) -> dict:
-    """Full enhanced OCR for multipage PDFs."""
-    pages = convert_from_bytes(file_bytes, dpi=180)
-    full_text = ""
-    combined_layout = []
-    all_handwriting = []
-    id_fields_collected = {}
+def choose_profile(doc) -> str:
+    """
+    "auto": pick a profile from cheap statistics of a 512px thumbnail.
+    Landscape ID-card shaped images get "full" (ID fields), pages with ruled
+    lines / tables get "standard" (layout), plain text pages get "fast".
+    """
+    gray = doc.gray
+    h, w = gray.shape
+    scale = 512 / max(h, w)
+    if scale < 1:
+        gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    # ID-1 cards are 85.6 x 54 mm (1.585) landscape; A4/Letter pages are not
+    if w > h and 1.5 <= w / h <= 1.7:
+        return "full"
+
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # long horizontal / vertical runs of ink = form or table rules
+    rules = cv2.morphologyEx(ink, cv2.MORPH_OPEN, np.ones((1, 40), np.uint8))
+    rules |= cv2.morphologyEx(ink, cv2.MORPH_OPEN, np.ones((40, 1), np.uint8))
+    if cv2.countNonZero(rules) > 0.002 * rules.size:
+        return "standard"
+    return "fast"
+
+
+def check_profile(profile) -> str:
+    """Validated profile name; None means core.config.OCR_DEFAULT_PROFILE."""
+    profile = profile or OCR_DEFAULT_PROFILE
+    if profile not in PROFILE_NAMES:
+        raise ValueError(f"Unknown OCR profile {profile!r}; expected one of {PROFILE_NAMES}")
+    return profile
+
+
+def resolve_profile(profile, doc) -> str:
+    profile = check_profile(profile)
+    return choose_profile(doc) if profile == "auto" else profile
+
+
+def _recognize(doc, prof, img=None, prep=None, page=1, layout_vis=False):
+    """Run the engines the profile asks for on one page."""
+    if img is None:
+        img = doc.bgr
+    lines = ocr_page(img, prof["cls"], page=page, size=doc.size, prep=prep)
+    out = {
+        "text": lines.text.strip(),
+        "lines": lines,
+        "layout": None,
+        "handwriting": "",
+        "handwriting_regions": [],
+    }
+    if prof["layout"]:
+        result, vis = analyze_layout(doc, visualize=layout_vis)
+        # JSON-safe regions; the raw engine result holds arrays
+        out["layout"] = layout_regions(result)
+        if layout_vis:
+            out["layout_vis"] = vis
+    if prof["handwriting"] and out["layout"] is not None:
+        # handwriting / signature regions found by layout; the whole page when
+        # the layout model has no such classes (see HANDWRITING_LAYOUT_LABELS)
+        hw = handwriting_from_layout(doc, out["layout"])
+        out["handwriting"] = hw["text"]
+        out["handwriting_regions"] = hw["regions"]
+    return out
+
 
-    for page in pages:
-        with tempfile.NamedTemporaryFile(suffix=".png") as tmp:
-            page.save(tmp.name)
+def ocr_image_bytes(file_bytes, profile=None, layout_vis=False) -> dict:
+    """
+    OCR for images (bytes or DocumentImage) with a named profile (see
+    OCR_PROFILES). "lines" is an OCRPage with boxes in source pixels;
+    layout_vis=True adds the layout engine's drawing as "layout_vis".
+    """
+    return _ocr_image(to_document_image(file_bytes), profile, layout_vis=layout_vis)
 
-            result = ocr_engine.ocr(tmp.name, cls=True)
-            if result:
-                page_text = " ".join([txt for block in result for box, (txt, conf) in block])
-                full_text += page_text + "\n"
 
-            combined_layout.append(analyze_layout(open(tmp.name, 'rb').read()))
-            all_handwriting.append(handwriting_ocr(open(tmp.name, 'rb').read()))
+def _ocr_image(doc, profile, page=1, layout_vis=False, id_fields=True):
+    name = resolve_profile(profile, doc)
+    prof = OCR_PROFILES[name]
 
-    id_fields_collected = extract_fields(full_text)
+    # ndarrays go straight to the engine: no PNG encode / disk / decode
+    img, prep = preprocess_pipeline(doc, prof["resize_max"], prof["binarize"], deskew_pages=prof["deskew"] and OCR_DESKEW)
+    out = _recognize(doc, prof, img, prep, page=page, layout_vis=layout_vis)
+    out["preprocess"] = prep
+    # line geometry lets labels and values sit in separate boxes
+    out["id_fields"] = extract_fields(out["lines"]) if prof["id_fields"] and id_fields else {}
+    out["profile"] = name
+    return out
+
+
+def _ocr_pdf_page(pdf_path: str, page_no: int, dpi: int, profile) -> dict:
+    # worker: render just this page, then OCR it; engines are serialized by
+    # their locks so one page renders while another is being recognized
+    try:
+        page = convert_from_path(pdf_path, dpi=dpi, first_page=page_no, last_page=page_no)[0]
+        page_doc = DocumentImage.from_pil(page)
+        name = resolve_profile(profile, page_doc)
+        out = _recognize(page_doc, OCR_PROFILES[name], page=page_no)
+        out.update(page=page_no, method="ocr", profile=name)
+        return out
+    except Exception as e:
+        return {"page": page_no, "method": "ocr", "error": str(e)}
+
+
+def iter_pdf_pages(file_bytes: bytes, dpi=None, workers=None, max_in_flight=None, pages=None, profile=None):
+    """
+    Streaming PDF OCR: yields one dict per page ({"page", "text", "lines",
+    "layout", "handwriting"} or {"page", "error"}) as soon as it completes, in
+    completion order. Pages are rendered one at a time inside the workers,
+    and at most max_in_flight pages (default 2 x workers) exist at once.
+    pages restricts OCR to those 1-based page numbers (default: all).
+    dpi defaults to the profile's render resolution ("auto" decides per page).
+    The PDF is written to one temporary file that every page render reads.
+    """
+    profile = check_profile(profile)
+    dpi = dpi or OCR_PROFILES.get(profile, {}).get("pdf_dpi", OCR_PDF_DPI)
+    with tempfile.TemporaryDirectory(prefix="ocr-pdf-") as tmp:
+        pdf_path = os.path.join(tmp, "document.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(file_bytes)
+        if pages is None:
+            pages = range(1, pdfinfo_from_path(pdf_path)["Pages"] + 1)
+        yield from iter_bounded(_ocr_pdf_page, ((pdf_path, page_no, dpi, profile) for page_no in pages),
+                                workers or OCR_PDF_WORKERS, max_in_flight)
+
+
+def _ocr_frame(doc, page_no: int, profile) -> dict:
+    # worker: OCR one decoded frame like a single image
+    try:
+        # ID fields are extracted once for the whole bundle (_assemble_pages)
+        out = _ocr_image(doc, profile, page=page_no, id_fields=False)
+        out.update(page=page_no, method="ocr")
+        return out
+    except Exception as e:
+        return {"page": page_no, "method": "ocr", "error": str(e)}
+
+
+def iter_image_pages(file_bytes, workers=None, max_in_flight=None, pages=None, profile=None):
+    """
+    Streaming OCR of a multi-page TIFF (fax bundles): the frame
+    counterpart of iter_pdf_pages, with the same bounded number of pages
+    in flight and the same per-page dicts. Frames are decoded one at a
+    time by core.utils.iter_frames as workers free up. Any other image
+    yields one page.
+    """
+    profile = check_profile(profile)
+    yield from iter_bounded(_ocr_frame, ((doc, page_no, profile) for page_no, doc in iter_frames(file_bytes, pages)),
+                            workers or OCR_PDF_WORKERS, max_in_flight)
+
+
+def iter_pdf_text(file_bytes: bytes, **kwargs):
+    """
+    Per-page text for a PDF, streamed. Pages with a usable embedded text
+    layer come first, straight from the layer with word coordinates
+    ("method": "text_layer", "lines" with one entry per word); only the
+    remaining scanned / garbled pages are rasterized and OCR'd ("method":
+    "ocr"). kwargs go to iter_pdf_pages.
+    """
+    layer = extract_text_layer(file_bytes)
+    if layer is None:
+        yield from iter_pdf_pages(file_bytes, **kwargs)
+        return
+
+    needs_ocr = []
+    for p in layer:
+        if p["usable"]:
+            yield {
+                "page": p["page"],
+                "method": "text_layer",
+                "text": p["text"],
+                "lines": OCRPage.from_words(p["words"], p["page"], p["width"], p["height"]),
+            }
+        else:
+            needs_ocr.append(p["page"])
+    if needs_ocr:
+        yield from iter_pdf_pages(file_bytes, pages=needs_ocr, **kwargs)
+
+
+def _merge_fields(per_page):
+    """First page that has a value wins, field by field."""
+    merged = {}
+    for fields in per_page:
+        for k, v in fields.items():
+            if merged.get(k) is None:
+                merged[k] = v
+    return merged
+
+
+def ocr_pdf_bytes(file_bytes: bytes, profile=None) -> dict:
+    """Text for multipage PDFs: text layer where usable, OCR elsewhere; pages reassembled in order."""
+    profile = check_profile(profile)
+    return _assemble_pages(iter_pdf_text(file_bytes, profile=profile), profile)
+
+
+def ocr_frames_bytes(file_bytes, profile=None) -> dict:
+    """Text for multi-frame images (multi-page TIFF), same result shape as ocr_pdf_bytes."""
+    profile = check_profile(profile)
+    return _assemble_pages(iter_image_pages(file_bytes, profile=profile), profile)
+
+
+def _assemble_pages(pages, profile) -> dict:
+    pages = sorted(pages, key=lambda p: p["page"])
+
+    full_text = "\n".join(p["text"] for p in pages if p.get("text"))
+    want_ids = profile == "full" or any(p.get("profile") == "full" for p in pages)
+    id_fields_collected = _merge_fields(extract_fields_batch(
+        [p["lines"] if p["method"] == "ocr" else p["text"] for p in pages if p.get("text")])) if want_ids else {}
+
+    page_info = []
+    for p in pages:
+        page_info.append({"page": p["page"], "method": p["method"], "profile": p.get("profile"),
+                          "text": p.get("text", ""), "lines": p.get("lines"), "error": p.get("error")})
 
     return {
         "text": full_text.strip(),
-        "layout": combined_layout,
-        "handwriting": all_handwriting,
-        "id_fields": id_fields_collected
+        "layout": [p.get("layout") for p in pages],
+        "handwriting": [p.get("handwriting", "") for p in pages],
+        "handwriting_regions": [p.get("handwriting_regions", []) for p in pages],
+        "id_fields": id_fields_collected,
+        "profile": profile,
+        "pages": page_info
     }
 
 
-def extract_text_from_upload(file_bytes, filename):
+def extract_text_from_upload(file_bytes, filename, use_cache=True, profile=None):
+    """
+    OCR an upload with a profile: "fast", "standard", "full" or "auto"
+    (default core.config.OCR_DEFAULT_PROFILE). Results are cached by
+    content SHA-256, profile and the effective preprocessing settings
+    (see core.cache), so changing OCR_DENOISE / OCR_DESKEW misses the cache.
+    """
     ext = filename.lower().split(".")[-1]
+    profile = check_profile(profile)
 
     if ext == "pdf":
-        return ocr_pdf_bytes(file_bytes)
-    return ocr_image_bytes(file_bytes)
+        if isinstance(file_bytes, DocumentImage):
+            file_bytes = file_bytes.data
+        kind = "pdf"
+        compute = lambda: ocr_pdf_bytes(file_bytes, profile)
+        content_hash = sha256_hex(file_bytes)
+    else:
+        doc = to_document_image(file_bytes)
+        # multi-page TIFF / fax bundles: every frame, not just the first
+        if frame_count(doc) > 1:
+            kind = "frames"
+            compute = lambda: ocr_frames_bytes(doc.data, profile)
+        else:
+            kind = "image"
+            compute = lambda: ocr_image_bytes(doc, profile)
+        content_hash = doc.content_hash
+
+    if not use_cache:
+        return compute()
+    return cached_call("ocr", OCR_VERSION, content_hash, compute, kind=kind, profile=profile,
+                       preprocess=preprocess_settings(profile))
@@ -0,0 +1,62 @@
+# modules/ocr/pdf_text.py
+"""
+Embedded text-layer extraction for born-digital PDFs (PyMuPDF).
+
+Pages whose text layer is present and readable are returned with word
+coordinates and never rasterized; everything else is left for OCR.
+PyMuPDF is optional: without it every page goes through OCR.
+"""
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf  # PyMuPDF < 1.24
+    except ImportError:
+        pymupdf = None
+
+# fewer printable characters than this means "no text layer" (scans, image-only pages)
+MIN_TEXT_CHARS = 20
+# share of U+FFFD / control / private-use characters above which the layer is garbage
+MAX_BAD_CHAR_RATIO = 0.1
+
+
+def _bad_char(c):
+    o = ord(c)
+    return c == "�" or (o < 32 and c not in "\t\n\r") or 0xE000 <= o <= 0xF8FF
+
+
+def text_layer_usable(text):
+    chars = [c for c in text if not c.isspace()]
+    if len(chars) < MIN_TEXT_CHARS:
+        return False
+    bad = sum(1 for c in chars if _bad_char(c))
+    return bad / len(chars) <= MAX_BAD_CHAR_RATIO
+
+
+def extract_text_layer(file_bytes: bytes):
+    """
+    Per-page text layer: [{"page", "text", "words", "width", "height", "usable"}].
+    words are [x0, y0, x1, y1, word] in PDF points (origin top-left).
+    Returns None when PyMuPDF is missing or the PDF cannot be opened.
+    """
+    if pymupdf is None:
+        return None
+    try:
+        doc = pymupdf.open(stream=file_bytes, filetype="pdf")
+    except Exception:
+        return None
+
+    pages = []
+    with doc:
+        for i, page in enumerate(doc):
+            words = page.get_text("words", sort=True)
+            text = page.get_text("text", sort=True)
+            pages.append({
+                "page": i + 1,
+                "text": text.strip(),
+                "words": [[round(w[0], 2), round(w[1], 2), round(w[2], 2), round(w[3], 2), w[4]] for w in words],
+                "width": round(page.rect.width, 2),
+                "height": round(page.rect.height, 2),
+                "usable": text_layer_usable(text),
+            })
+    return pages
@@ -0,0 +1,142 @@
+# modules/ocr/result.py
+"""
+Columnar OCR result for one page.
+
+Lines are stored as contiguous arrays instead of nested Python objects:
+boxes (N, 4, 2) float32 corner points in source-image pixels (PDF points
+for text-layer pages), scores (N,) float32, order (N,) int32 reading
+order as indices into the lines, and all line text in one string buffer
+with (N + 1,) int32 offsets. Serializes to compact JSON (to_dict) or to
+Arrow (to_arrow / pages_to_arrow, pyarrow optional); result_to_dict
+converts a whole OCR result for JSON responses.
+"""
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+class OCRPage:
+    __slots__ = ("page", "width", "height", "boxes", "scores", "order", "text_buffer", "offsets")
+
+    def __init__(self, boxes, scores, texts, order=None, page=1, width=0, height=0):
+        self.page = int(page)
+        self.width = float(width)
+        self.height = float(height)
+        self.boxes = np.ascontiguousarray(boxes, dtype=np.float32).reshape(-1, 4, 2)
+        self.scores = np.ascontiguousarray(scores, dtype=np.float32).reshape(-1)
+        n = len(self.boxes)
+        if len(self.scores) != n or len(texts) != n:
+            raise ValueError(f"OCRPage columns differ in length: {n} boxes, {len(self.scores)} scores, {len(texts)} texts")
+        self.order = (np.arange(n, dtype=np.int32) if order is None
+                      else np.ascontiguousarray(order, dtype=np.int32).reshape(-1))
+        self.text_buffer = "".join(texts)
+        self.offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum([len(t) for t in texts], out=self.offsets[1:])
+
+    @classmethod
+    def from_words(cls, words, page=1, width=0, height=0):
+        """Text-layer words [x0, y0, x1, y1, word] (already in reading order), score 1."""
+        rects = np.asarray([w[:4] for w in words], dtype=np.float32).reshape(-1, 4)
+        x0, y0, x1, y1 = rects.T
+        boxes = np.stack([np.stack([x0, y0], 1), np.stack([x1, y0], 1),
+                          np.stack([x1, y1], 1), np.stack([x0, y1], 1)], 1)
+        return cls(boxes, np.ones(len(words)), [w[4] for w in words], page=page, width=width, height=height)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def line_text(self, i):
+        return self.text_buffer[self.offsets[i]:self.offsets[i + 1]]
+
+    def texts(self, min_score=0.0):
+        """Line texts in reading order."""
+        return [self.line_text(i) for i in self.order if self.scores[i] >= min_score]
+
+    @property
+    def text(self):
+        return " ".join(self.texts())
+
+    def bboxes(self):
+        """Axis-aligned (N, 4) [x1, y1, x2, y2] per line, for highlighting / crops."""
+        return np.concatenate([self.boxes.min(axis=1), self.boxes.max(axis=1)], axis=1)
+
+    def to_dict(self, decimals=1):
+        """
+        Compact JSON form: flat box coordinates (8 per line), scores,
+        order, one text string and its offsets. from_dict() inverts it.
+        """
+        return {
+            "page": self.page,
+            "width": self.width,
+            "height": self.height,
+            "boxes": np.round(self.boxes.reshape(-1), decimals).tolist(),
+            "scores": np.round(self.scores, 4).tolist(),
+            "order": self.order.tolist(),
+            "text": self.text_buffer,
+            "offsets": self.offsets.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        buf, off = d["text"], d["offsets"]
+        texts = [buf[off[i]:off[i + 1]] for i in range(len(off) - 1)]
+        return cls(d["boxes"], d["scores"], texts, d["order"], d["page"], d["width"], d["height"])
+
+    def to_arrow(self):
+        return pages_to_arrow([self])
+
+    def __repr__(self):
+        return f"OCRPage(page={self.page}, lines={len(self)}, size={self.width:g}x{self.height:g})"
+
+
+def pages_to_arrow(pages):
+    """One row per line: page, line, reading_order, box (8 x float32), score, text."""
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed; use to_dict() for JSON instead")
+    cols = {"page": [], "line": [], "reading_order": [], "box": [], "score": [], "text": []}
+    for p in pages:
+        n = len(p)
+        rank = np.empty(n, dtype=np.int32)
+        rank[p.order] = np.arange(n, dtype=np.int32)
+        cols["page"].append(np.full(n, p.page, dtype=np.int32))
+        cols["line"].append(np.arange(n, dtype=np.int32))
+        cols["reading_order"].append(rank)
+        cols["box"].append(p.boxes.reshape(-1))
+        cols["score"].append(p.scores)
+        cols["text"].extend(p.line_text(i) for i in range(n))
+    cat = lambda key, dtype: np.concatenate(cols[key]) if cols[key] else np.zeros(0, dtype)
+    return pa.table({
+        "page": pa.array(cat("page", np.int32)),
+        "line": pa.array(cat("line", np.int32)),
+        "reading_order": pa.array(cat("reading_order", np.int32)),
+        "box": pa.FixedSizeListArray.from_arrays(pa.array(cat("box", np.float32)), 8),
+        "score": pa.array(cat("score", np.float32)),
+        "text": pa.array(cols["text"], type=pa.string()),
+    })
+
+
+def pages_to_ipc(pages) -> bytes:
+    """Arrow IPC stream bytes for a list of OCRPage."""
+    table = pages_to_arrow(pages)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def result_pages(ocr) -> list:
+    """The OCRPage of every page in an ocr_image_bytes / ocr_pdf_bytes result."""
+    if ocr.get("lines") is not None:
+        return [ocr["lines"]]
+    return [p["lines"] for p in ocr.get("pages") or [] if p.get("lines") is not None]
+
+
+def result_to_dict(ocr) -> dict:
+    """JSON-ready view of an extract_text_from_upload result: OCRPages via to_dict()."""
+    page_info = [{k: v for k, v in p.items() if k != "lines"} for p in ocr.get("pages") or []] or None
+    return {"text": ocr["text"], "profile": ocr["profile"], "id_fields": ocr["id_fields"],
+            "lines": [p.to_dict() for p in result_pages(ocr)], "layout": ocr.get("layout"),
+            "handwriting_regions": ocr.get("handwriting_regions"), "pages": page_info}
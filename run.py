@@ -6,30 +6,50 @@ Run:
     uvicorn run:app --host 127.0.0.1 --port 8000
 
 Endpoints:
-- POST /ocr                 -> multipart file upload -> returns extracted text
-- POST /forensics           -> multipart file upload -> returns forensic analysis
+- POST /ocr                 -> multipart file upload (?profile=fast|standard|full|auto, ?format=json|arrow) -> text, line boxes and confidences
+- POST /ocr/stream          -> multipart PDF or multi-page TIFF upload -> NDJSON stream of {"page", "method", "text"} as pages finish
+- POST /forensics           -> multipart file upload (?triage=true for staged early exit) -> returns forensic analysis (+ "pages" for multi-page TIFF, "pdf_report" for PDFs)
+- POST /forensics/batch     -> multipart list of images and/or .zip archives -> NDJSON stream, one line per document
+- GET  /artifacts/{id}      -> ?fmt=png|webp -> renders an ELA / heatmap artifact referenced by a forensic result
 - POST /fake-news           -> JSON { "text": "..."} -> returns classifier + evidence
 - POST /llm-chat            -> JSON { "message": "..."} -> returns LLM reply (Ollama)
 - POST /all-in-one          -> multipart file upload -> runs full pipeline and returns JSON
+- POST /warmup              -> ?models=ocr&models=layout (default: all) -> loads models, returns load timings
+- GET  /ready               -> 200 once every PRELOAD_MODELS model is loaded, else 503; per-model status
+- GET  /metrics             -> queue depth and batch sizes of the classifier and OCR batchers
 """
 
 import io
 import os
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import json
+import logging
+import itertools
+from datetime import datetime
+import threading
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query
+from fastapi.responses import StreamingResponse, Response, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
-from api.server import app
 
 # local modules (reuse your existing code)
-from modules.ocr.ocr_service import extract_text_from_upload
-from modules.forensics.forensic_pipeline import analyze_document_forensics
+from modules.ocr.ocr_service import extract_text_from_upload, iter_pdf_text, iter_image_pages, check_profile, get_batcher
+from modules.ocr.result import result_pages, result_to_dict, pages_to_ipc
+from modules.forensics.forensic_pipeline import analyze_document_forensics, iter_frame_forensics
+from modules.forensics.batch import analyze_batch_async, iter_zip_images
+from modules.forensics.artifacts import ARTIFACT_FORMATS, get_artifact
 from modules.news.preprocess import clean_text, extract_claims
-from modules.news.classifier import NewsClassifier
-from modules.news.rag_search import Retriever
+import modules.news.classifier  # registers "news_classifier"
+import modules.news.rag_search  # registers "retriever"
 from modules.genai.explain_doc import explain_document
 from modules.genai.explain_news import explain_news
 from modules.genai.llm_engine import run_llm
+from core.utils import to_document_image, frame_count
+from core.models import registry, get_model
+from core.config import PRELOAD_MODELS
+
+logger = logging.getLogger(__name__)
 
 # sample file path (user-provided file saved in session)
 SAMPLE_LOCAL_FILE = "/mnt/data/Screenshot 2025-11-22 233923.png"
@@ -43,26 +63,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# singletons
-_classifier = None
-_retriever = None
+# models load lazily through core.models on first use
 
 
 def get_classifier():
-    global _classifier
-    if _classifier is None:
-        try:
-            _classifier = NewsClassifier("models/fake_news/distilbert_news")
-        except Exception:
-            _classifier = NewsClassifier("distilbert-base-uncased")
-    return _classifier
+    return get_model("news_classifier")
 
 
 def get_retriever():
-    global _retriever
-    if _retriever is None:
-        _retriever = Retriever()
-    return _retriever
+    return get_model("retriever")
+
+
+# PRELOAD_MODELS names that match no registered model (reported by /ready)
+_unknown_preload = []
+
+
+@app.on_event("startup")
+def preload_models():
+    # optional background preload (PRELOAD_MODELS=ocr,layout); requests are served meanwhile
+    registered = registry.status()
+    _unknown_preload[:] = [n for n in PRELOAD_MODELS if n not in registered]
+    if _unknown_preload:
+        logger.warning("PRELOAD_MODELS: unknown model(s) %s; registered: %s", _unknown_preload, sorted(registered))
+    known = [n for n in PRELOAD_MODELS if n in registered]
+    if known:
+        threading.Thread(target=registry.warmup, args=(known,), daemon=True).start()
+
+
+@app.post("/warmup")
+async def warmup_endpoint(models: Optional[List[str]] = Query(None)):
+    """Load the selected models now (default: every registered model)."""
+    try:
+        return {"models": await run_in_threadpool(registry.warmup, models)}
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/ready")
+async def ready_endpoint():
+    """Ready once every PRELOAD_MODELS model is loaded (other models still load lazily)."""
+    status = registry.status()
+    pending = [n for n in PRELOAD_MODELS if n in status and not status[n]["loaded"]]
+    ready = not pending and not _unknown_preload
+    body = {"ready": ready, "pending": pending, "unknown_models": list(_unknown_preload), "models": status}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # the classifier is not loaded just to report on it
+    clf = registry.peek("news_classifier")
+    batcher = getattr(clf, "batcher", None)
+    return {
+        "news_classifier": batcher.stats() if batcher is not None else None,
+        "ocr_recognition": get_batcher().stats(),
+    }
 
 
 class TextPayload(BaseModel):
@@ -74,35 +129,116 @@ class ChatPayload(BaseModel):
     history: Optional[list] = None
 
 
+def _profile_or_400(profile):
+    try:
+        return check_profile(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/ocr")
-async def ocr_endpoint(file: UploadFile = File(...)):
+async def ocr_endpoint(file: UploadFile = File(...), profile: Optional[str] = None, format: str = "json"):
+    """
+    format=json: text plus columnar lines per page (see OCRPage.to_dict);
+    format=arrow: an Arrow IPC stream with one row per line.
+    """
+    profile = _profile_or_400(profile)
+    if format not in ("json", "arrow"):
+        raise HTTPException(status_code=400, detail="format must be json or arrow")
     try:
         data = await file.read()
-        text = extract_text_from_upload(data, file.filename)
-        return {"text": text}
+        ocr = extract_text_from_upload(data, file.filename, profile=profile)
+        if format == "arrow":
+            return Response(content=pages_to_ipc(result_pages(ocr)), media_type="application/vnd.apache.arrow.stream")
+        return result_to_dict(ocr)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/ocr/stream")
+async def ocr_stream_endpoint(file: UploadFile = File(...), profile: Optional[str] = None):
+    """Page-by-page PDF / multi-page TIFF OCR; the first lines arrive long before the last page is done."""
+    profile = _profile_or_400(profile)
+    is_pdf = file.filename.lower().endswith(".pdf")
+    if not is_pdf and not file.filename.lower().endswith((".tif", ".tiff")):
+        raise HTTPException(status_code=400, detail="/ocr/stream expects a PDF or TIFF")
+    data = await file.read()
+    pages = iter_pdf_text(data, profile=profile) if is_pdf else iter_image_pages(data, profile=profile)
+
+    def stream():
+        # sync generator: Starlette iterates it in a worker thread
+        for page in pages:
+            row = {"page": page["page"], "method": page["method"], "text": page.get("text", "")}
+            if "error" in page:
+                row["error"] = page["error"]
+            yield json.dumps(row) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @app.post("/forensics")
-async def forensics_endpoint(file: UploadFile = File(...)):
+async def forensics_endpoint(file: UploadFile = File(...), triage: bool = False):
     try:
         data = await file.read()
-        forensic = analyze_document_forensics(data)
-        # Note: images (ela/tamper) are not returned as binary here; return metadata + base64 optionally
+        if frame_count(data) > 1:
+            # multi-page TIFF: every page; "forensic" is the highest-risk one
+            pages = sorted(iter_frame_forensics(data, triage=triage), key=lambda p: p["page"])
+            scored = [p for p in pages if "forensic" in p]
+            if not scored:
+                raise ValueError(pages[0]["error"] if pages else "no readable pages")
+            worst = max(scored, key=lambda p: p["forensic"]["fraud_score"])
+            return {"forensic": worst["forensic"], "page": worst["page"], "pages": pages}
+        forensic = analyze_document_forensics(data, triage=triage)
+        # *_artifact fields are IDs; fetch the images from /artifacts/{id}
         return {"forensic": forensic}
+    except ValueError as e:
+        # unreadable upload
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/forensics/batch")
+async def forensics_batch_endpoint(files: List[UploadFile] = File(...), triage: bool = False):
+    """Fan documents out over the process pool and stream results as they finish."""
+    sources = []
+    for f in files:
+        data = await f.read()
+        if f.filename.lower().endswith(".zip"):
+            try:
+                sources.append(iter_zip_images(data))
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"{f.filename}: {e}")
+        else:
+            sources.append([(f.filename, data)])
+
+    async def stream():
+        async for row in analyze_batch_async(itertools.chain.from_iterable(sources), triage=triage):
+            yield json.dumps(row) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/artifacts/{artifact_id}")
+async def artifact_endpoint(artifact_id: str, fmt: str = "png"):
+    """Render (first request) or serve (cached) a forensic visualization."""
+    if fmt not in ARTIFACT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"fmt must be one of {sorted(ARTIFACT_FORMATS)}")
+    content = await run_in_threadpool(get_artifact, artifact_id, fmt)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired artifact")
+    return Response(content=content, media_type=f"image/{fmt}")
+
+
 @app.post("/fake-news")
 async def fake_news_endpoint(payload: TextPayload):
     try:
         text = payload.text
         cleaned = clean_text(text)
         claims = extract_claims(cleaned)
-        clf = get_classifier()
-        pred = clf.predict([cleaned])[0]
+        clf = await run_in_threadpool(get_classifier)
+        # off the event loop, so concurrent requests can share a batch
+        pred = (await run_in_threadpool(clf.predict, [cleaned]))[0]
         retriever = get_retriever()
         evidence = retriever.query(claims[0] if claims else cleaned[:200], top_k=5)
         return {"prediction": pred, "claims": claims, "evidence": evidence}
@@ -122,22 +258,26 @@ async def llm_chat(payload: ChatPayload):
 
 
 @app.post("/all-in-one")
-async def all_in_one(file: UploadFile = File(...)):
+async def all_in_one(file: UploadFile = File(...), profile: Optional[str] = None):
     """
     Runs OCR -> Forensics -> FakeNews -> GenAI on uploaded file and returns combined JSON.
     """
+    profile = _profile_or_400(profile)
     try:
         data = await file.read()
         filename = file.filename
+        # decode once, shared by OCR and forensics
+        doc = to_document_image(data)
         # OCR
-        text = extract_text_from_upload(data, filename)
+        text = extract_text_from_upload(doc, filename, profile=profile)["text"]
         # Forensics
-        forensic = analyze_document_forensics(data)
+        forensic = analyze_document_forensics(doc)
         # Fake news
         cleaned = clean_text(text)
         claims = extract_claims(cleaned)
-        clf = get_classifier()
-        pred = clf.predict([cleaned])[0]
+        clf = await run_in_threadpool(get_classifier)
+        # off the event loop, so concurrent requests can share a batch
+        pred = (await run_in_threadpool(clf.predict, [cleaned]))[0]
         retriever = get_retriever()
         evidence = retriever.query(claims[0] if claims else cleaned[:200], top_k=5)
         # GenAI explanations
@@ -167,8 +307,9 @@ async def demo_sample():
     with open(SAMPLE_LOCAL_FILE, "rb") as f:
         data = f.read()
     # call the same pipeline
-    text = extract_text_from_upload(data, os.path.basename(SAMPLE_LOCAL_FILE))
-    forensic = analyze_document_forensics(data)
+    doc = to_document_image(data)
+    text = extract_text_from_upload(doc, os.path.basename(SAMPLE_LOCAL_FILE))["text"]
+    forensic = analyze_document_forensics(doc)
     cleaned = clean_text(text)
     claims = extract_claims(cleaned)
     pred = get_classifier().predict([cleaned])[0]